@@ -1,11 +1,31 @@
 from flask import (
     Flask, request, jsonify,
-    send_from_directory, session
+    send_file, session, g,
+    Response, stream_with_context, make_response
 )
 from flask_cors import CORS
-import os, sqlite3
-from functools import wraps
+import os, re, sqlite3, threading, time, json
+import hashlib, secrets, shutil, tempfile, base64
+import csv, io, zipfile, html
+from functools import lru_cache, wraps
+from bisect import bisect_left
+from urllib.parse import quote
+from contextlib import contextmanager, suppress
+from collections import OrderedDict
+import click
 import werkzeug
+
+try:
+    import fcntl  # POSIX: upload locks then hold across worker processes
+except ImportError:
+    fcntl = None
+
+from jobs import (
+    JOB_CLAIM_SQL, JOB_QUEUE_MAX, JOB_POLL_SECONDS, JobRunner,
+    enqueue_job, job_status, pending_job_count,
+)
+from pdfs import inspect_pdf
+
 # --- config & helpers -------------------------------------------------------
 
 app = Flask(__name__)
@@ -13,8 +33,15 @@ CORS(app,
      supports_credentials=True,
      origins=["http://localhost:5173", "http://localhost:8080"])
 app.secret_key = "robotmza"
+# Caps any single request body (a whole /saveFile upload or one upload chunk).
+app.config["MAX_CONTENT_LENGTH"] = 64 * 1024 * 1024
 
-DATABASE = "datab.db"
+# Paths come from the environment so every entry point (dev server, gunicorn,
+# flask CLI) resolves them the same way, whatever the working directory.
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DATABASE = os.environ.get("DATABASE", os.path.join(BACKEND_DIR, "datab.db"))
+FILES_ROOT = os.environ.get("FILES_ROOT", os.path.join(BACKEND_DIR, "etablissements"))
+BLOB_ROOT = os.environ.get("BLOB_ROOT", os.path.join(BACKEND_DIR, "blobs"))
 ROWS = ["AE", "CE", "IGF", "CC"]
 COLS = ["IC", "OB", "REC", "CA", "DD", "DA"]
 SEP = "|"
@@ -31,20 +58,554 @@ def login_required(fn):
         return fn(*a, **kw)
     return wrapper
 
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(*values):
+    """Opaque keyset cursor: the sort key of the last row of a page."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(token):
+    """The values encode_cursor() was given, or None if ``token`` is not a cursor."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except ValueError:
+        return None
+    return values if isinstance(values, list) and values else None
+
+# --- instrumentation --------------------------------------------------------
+#
+# Every request gets a RequestTimings (thread-local, one request per thread)
+# that pooled connections and fs_timer() add to. after_request folds it into
+# process-wide histograms/counters, served in Prometheus text format by
+# /metrics. Under gunicorn each worker writes a snapshot to METRICS_DIR and
+# /metrics adds them up, so any worker can answer the scrape.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Log requests slower than this many ms with their breakdown (0 = off).
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", 0))
+METRICS_DIR = os.environ.get("METRICS_DIR")
+METRICS_FLUSH_SECONDS = 1.0
+
+class RequestTimings:
+    __slots__ = ("start", "sql_count", "sql_seconds", "fs")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.fs = {}
+
+_timings = threading.local()
+
+def current_timings():
+    return getattr(_timings, "current", None)
+
+class TimedCursor(sqlite3.Cursor):
+    """Adds statement and fetch time to the running request's timings.
+
+    Rows pulled by iterating the cursor directly are not timed.
+    """
+
+    def _timed(self, fn, args, statements):
+        timings = current_timings()
+        if timings is None:
+            return fn(*args)
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            timings.sql_seconds += time.perf_counter() - start
+            timings.sql_count += statements
+
+    def execute(self, *args):
+        return self._timed(super().execute, args, 1)
+
+    def executemany(self, *args):
+        return self._timed(super().executemany, args, 1)
+
+    def executescript(self, *args):
+        return self._timed(super().executescript, args, 1)
+
+    def fetchone(self):
+        return self._timed(super().fetchone, (), 0)
+
+    def fetchmany(self, *args):
+        return self._timed(super().fetchmany, args, 0)
+
+    def fetchall(self):
+        return self._timed(super().fetchall, (), 0)
+
+class TimedConnection(sqlite3.Connection):
+    # Connection.execute() does not go through cursor(), hence the overrides.
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def executescript(self, *args):
+        return self.cursor().executescript(*args)
+
+def new_histogram():
+    # per-bucket counts (not cumulative), then +Inf, then the sum
+    return [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+
+def observe(histogram, seconds):
+    histogram[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+    histogram[-1] += seconds
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}   # (method, route, status) -> count
+        self.latency = {}    # (method, route) -> histogram
+        self.sql = {}        # route -> [statements, seconds]
+        self.fs = {}         # operation -> histogram
+
+    def record_request(self, method, route, status, seconds, timings):
+        with self._lock:
+            key = (method, route, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            hist = self.latency.get((method, route))
+            if hist is None:
+                hist = self.latency[(method, route)] = new_histogram()
+            observe(hist, seconds)
+            sql = self.sql.setdefault(route, [0, 0.0])
+            sql[0] += timings.sql_count
+            sql[1] += timings.sql_seconds
+
+    def record_fs(self, op, seconds):
+        with self._lock:
+            hist = self.fs.get(op)
+            if hist is None:
+                hist = self.fs[op] = new_histogram()
+            observe(hist, seconds)
+
+    def snapshot(self):
+        with self._lock:
+            snap = {
+                "requests": [[*k, v] for k, v in self.requests.items()],
+                "latency": [[*k, list(v)] for k, v in self.latency.items()],
+                "sql": [[k, *v] for k, v in self.sql.items()],
+                "fs": [[k, list(v)] for k, v in self.fs.items()],
+            }
+        snap["cache"] = response_cache.stats()
+        snap["idleConnections"] = _pool.idle_count() if _pool is not None else 0
+        return snap
+
+    def flush(self):
+        """Write this process's snapshot to METRICS_DIR."""
+        if not METRICS_DIR:
+            return
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp, path)
+
+    def start_flushing(self):
+        """Keep this worker's file current even while it sits idle."""
+        def loop():
+            while True:
+                time.sleep(METRICS_FLUSH_SECONDS)
+                self.flush()
+        if METRICS_DIR:
+            threading.Thread(target=loop, name="metrics-flush", daemon=True).start()
+
+    def collect(self):
+        """Snapshots of every worker (files of exited ones included)."""
+        if not METRICS_DIR:
+            return [self.snapshot()]
+        self.flush()
+        snaps = []
+        for name in os.listdir(METRICS_DIR):
+            if name.endswith(".json"):
+                try:
+                    with open(os.path.join(METRICS_DIR, name)) as f:
+                        snaps.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return snaps
+
+metrics = Metrics()
+
+@contextmanager
+def fs_timer(op):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        metrics.record_fs(op, seconds)
+        timings = current_timings()
+        if timings is not None:
+            timings.fs[op] = timings.fs.get(op, 0.0) + seconds
+
+@app.before_request
+def start_request_timer():
+    _timings.current = RequestTimings()
+
+@app.after_request
+def record_request_metrics(response):
+    timings = current_timings()
+    if timings is None:
+        return response
+    seconds = time.perf_counter() - timings.start
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.record_request(request.method, route, response.status_code, seconds, timings)
+    if SLOW_REQUEST_MS and seconds * 1000 >= SLOW_REQUEST_MS:
+        fs_seconds = sum(timings.fs.values())
+        app.logger.warning("slow request %s", json.dumps({
+            "method": request.method,
+            "route": route,
+            "viewArgs": request.view_args,
+            "args": request.args.to_dict(flat=False),
+            "status": response.status_code,
+            "ms": round(seconds * 1000, 1),
+            "sqlStatements": timings.sql_count,
+            "sqlMs": round(timings.sql_seconds * 1000, 1),
+            "fsMs": {op: round(s * 1000, 1) for op, s in timings.fs.items()},
+            "otherMs": round((seconds - timings.sql_seconds - fs_seconds) * 1000, 1),
+        }, ensure_ascii=False))
+    return response
+
+@app.teardown_request
+def clear_request_timer(exc):
+    _timings.current = None
+
+# --- database connections ---------------------------------------------------
+
+# Applied once to every new connection. WAL lets readers run alongside a
+# writer, and synchronous=NORMAL is durable in WAL mode while skipping the
+# fsync on every commit.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-16000",      # ~16 MiB page cache
+    "PRAGMA mmap_size=268435456",    # 256 MiB
+    "PRAGMA temp_store=MEMORY",
+)
+STATEMENT_CACHE_SIZE = 256
+POOL_SIZE = 16
+
+class ConnectionPool:
+    """Keeps idle SQLite connections around so requests don't reconnect.
+
+    A connection is checked out for the lifetime of an app context (so one
+    per worker thread at any time) and handed back on teardown.
+    """
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        con = sqlite3.connect(
+            self.path,
+            cached_statements=STATEMENT_CACHE_SIZE,
+            check_same_thread=False,
+            factory=TimedConnection,
+        )
+        con.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            con.execute(pragma)
+        return con
+
+    def acquire(self):
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return self._connect()
+
+    def release(self, con):
+        if con.in_transaction:
+            con.rollback()
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(con)
+                return
+        con.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for con in idle:
+            con.close()
+
+    def fill(self, n):
+        """Open connections up front so the first requests don't pay for it."""
+        cons = [self.acquire() for _ in range(min(n, self.size))]
+        for con in cons:
+            self.release(con)
+
+    def idle_count(self):
+        return len(self._idle)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.path != DATABASE:
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(DATABASE)
+            con = _pool.acquire()
+            try:
+                migrate(con)
+            finally:
+                _pool.release(con)
+        return _pool
+
+@contextmanager
+def pooled_connection():
+    """Borrow a pooled connection outside of a request (CLI, caches)."""
+    pool = get_pool()
+    con = pool.acquire()
+    try:
+        yield con
+    finally:
+        pool.release(con)
+
+def get_db():
+    """Connection bound to the current app context (reused until teardown)."""
+    if "db" not in g:
+        pool = get_pool()
+        g.db = pool.acquire()
+        g.db_pool = pool
+    return g.db
+
+@app.teardown_appcontext
+def release_db(exc):
+    con = g.pop("db", None)
+    if con is not None:
+        g.pop("db_pool").release(con)
+
 def query_db(query, args=(), one=False):
-    con = sqlite3.connect(DATABASE)
-    cur = con.cursor()
-    cur.execute(query, args)
+    cur = get_db().execute(query, args)
     rv = cur.fetchall()
-    con.close()
     if one:
         return rv[0] if rv else None
     return rv
 
-def get_db():
+# --- schema migrations ------------------------------------------------------
+#
+# The schema lives in migrations/NNNN_name.sql, applied in order when the pool
+# is first created. PRAGMA user_version holds the last version applied. Some
+# migrations also backfill from Python (MIGRATION_BACKFILLS), in the same
+# transaction.
+
+MIGRATIONS_DIR = os.path.join(BACKEND_DIR, "migrations")
+MIGRATION_RE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+MIGRATION_BACKFILLS = {
+    2: lambda con: rebuild_matrix_stats(con),
+    # report_files tables created before the sha256 column existed
+    3: lambda con: (ensure_column(con, "report_files", "sha256", "TEXT"), reconcile_report_files(con)),
+    # databases built from schema.sql already have the column
+    7: lambda con: ensure_column(con, "matrix_data", "revision", "INTEGER NOT NULL DEFAULT 0"),
+}
+
+def list_migrations():
+    """[(version, name, path)] in version order."""
+    found = []
+    for fn in os.listdir(MIGRATIONS_DIR):
+        m = MIGRATION_RE.match(fn)
+        if m:
+            found.append((int(m.group(1)), m.group(2), os.path.join(MIGRATIONS_DIR, fn)))
+    return sorted(found)
+
+def split_statements(script):
+    statements, pending = [], ""
+    for line in script.splitlines(keepends=True):
+        pending += line
+        if sqlite3.complete_statement(pending):
+            statements.append(pending.strip())
+            pending = ""
+    return statements
+
+def schema_version(con):
+    return con.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(con):
+    """Apply pending migrations, one transaction each; returns [(version, name)]."""
+    applied = []
+    for version, name, path in list_migrations():
+        if version <= schema_version(con):
+            continue
+        with open(path, encoding="utf-8") as f:
+            statements = split_statements(f.read())
+        # Workers starting together queue up here; the others then find the
+        # version already bumped and skip it.
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            if version <= schema_version(con):
+                con.rollback()
+                continue
+            for statement in statements:
+                con.execute(statement)
+            if version in MIGRATION_BACKFILLS:
+                MIGRATION_BACKFILLS[version](con)
+            con.execute(f"PRAGMA user_version = {version}")
+            con.commit()
+        except BaseException:
+            con.rollback()
+            raise
+        applied.append((version, name))
+    return applied
+
+def ensure_column(con, table, column, decl):
+    if column not in {r[1] for r in con.execute(f"PRAGMA table_info({table})")}:
+        con.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+@app.cli.command("migrate")
+def migrate_command():
+    """Apply pending schema migrations and print the schema version."""
     con = sqlite3.connect(DATABASE)
-    con.row_factory = sqlite3.Row
-    return con
+    try:
+        for version, name in migrate(con):
+            click.echo(f"applied {version:04d}_{name}")
+        click.echo(f"schema version {schema_version(con)}")
+    finally:
+        con.close()
+
+# --- establishment lookups --------------------------------------------------
+
+DATA_VERSION_CHECK_SECONDS = 1.0
+
+class DataVersionWatcher:
+    """Notices commits made to DATABASE by any other connection or process.
+
+    Polls ``PRAGMA data_version`` on a dedicated connection, at most once per
+    ``interval`` seconds, and exposes a ``generation`` counter that goes up
+    each time the database changed. In-process caches compare it with the
+    generation they were built from.
+    """
+
+    def __init__(self, interval=DATA_VERSION_CHECK_SECONDS):
+        self.interval = interval
+        self.generation = 0
+        self._con = None
+        self._path = None
+        self._seen = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def poll(self):
+        if self._path == DATABASE and time.monotonic() - self._checked_at < self.interval:
+            return self.generation
+        with self._lock:
+            now = time.monotonic()
+            if self._path != DATABASE:
+                if self._con is not None:
+                    self._con.close()
+                self._con = sqlite3.connect(DATABASE, check_same_thread=False)
+                self._path, self._seen = DATABASE, None
+            elif now - self._checked_at < self.interval:
+                return self.generation
+            self._checked_at = now
+            version = self._con.execute("PRAGMA data_version").fetchone()[0]
+            if version != self._seen:
+                self._seen = version
+                self.generation += 1
+            return self.generation
+
+data_watcher = DataVersionWatcher()
+
+class TableCache:
+    """Process-wide snapshot of a small table, rebuilt when the data changes.
+
+    Subclasses implement ``_build(con)``. The snapshot is rebuilt after
+    ``invalidate()`` or once ``data_watcher`` reports a commit.
+    """
+
+    def __init__(self, watcher, empty):
+        self._watcher = watcher
+        self._generation = None
+        self._snapshot = empty
+        self._lock = threading.Lock()
+        self._source_version = None
+
+    def invalidate(self):
+        self._generation = None
+
+    def sync(self, version):
+        """Rebuild on next use if ``version`` of the source data differs from the last one seen."""
+        if version != self._source_version:
+            self._source_version = version
+            self.invalidate()
+
+    def _load(self):
+        generation = self._watcher.poll()
+        if generation == self._generation:
+            return self._snapshot
+        with self._lock:
+            if generation != self._generation:
+                with pooled_connection() as con:
+                    self._snapshot = self._build(con)
+                self._generation = generation
+            return self._snapshot
+
+    def _build(self, con):
+        raise NotImplementedError
+
+ESTABLISHMENTS_SQL = "SELECT establishment_id, name, code FROM establishments ORDER BY name"
+
+class EstablishmentDirectory(TableCache):
+    """Serves code -> id and id -> (name, code) lookups from dicts."""
+
+    def __init__(self, watcher):
+        super().__init__(watcher, ({}, {}, []))
+
+    def _build(self, con):
+        rows = con.execute(ESTABLISHMENTS_SQL).fetchall()
+        by_code = {code: (eid, name, code) for eid, name, code in rows}
+        by_id = {eid: (eid, name, code) for eid, name, code in rows}
+        listing = [{"key": code, "label": name} for _, name, code in rows]
+        return by_code, by_id, listing
+
+    def id_for(self, code):
+        row = self._load()[0].get(code)
+        return row[0] if row else None
+
+    def by_code(self, code):
+        """(id, name, code) for a code, or None."""
+        return self._load()[0].get(code)
+
+    def by_id(self, id):
+        """(id, name, code) for an id, or None."""
+        return self._load()[1].get(id)
+
+    def listing(self):
+        """[{"key": code, "label": name}, ...] ordered by name."""
+        return self._load()[2]
+
+class ReportTypeCatalog(TableCache):
+    """The report_types table, as served by /api/report-types."""
+
+    def __init__(self, watcher):
+        super().__init__(watcher, [])
+
+    def _build(self, con):
+        return [
+            {"report_type_id": r[0], "key": r[1], "description": r[2]}
+            for r in con.execute(
+                "SELECT report_type_id, type_code, description FROM report_types ORDER BY type_code"
+            )
+        ]
+
+    def listing(self):
+        return self._load()
+
+establishments = EstablishmentDirectory(data_watcher)
+report_types = ReportTypeCatalog(data_watcher)
 
 # def load_row(folder, row):
 #     path = os.path.join(folder, f"{row}.txt")
@@ -58,6 +619,107 @@ def get_db():
 #     with open(path, "w") as f:
 #         f.write(SEP.join(data))
 
+# --- response cache ---------------------------------------------------------
+#
+# GET endpoints decorated with @cached_response keep their serialized JSON in
+# a bounded LRU. The ETag is the version of the resource the response was
+# built from, read from the database: matrix_data.revision for a matrix, the
+# cache_versions rows (bumped by triggers) for the rest. Every worker process
+# hands out the same ETag for the same data, and only writes to that
+# resource change it. A matching If-None-Match gets a 304 without running
+# the view.
+
+RESPONSE_CACHE_ENTRIES = 2048
+
+# (kind, *args) -> one-row query giving the version of that resource
+CACHE_VERSION_SQL = {
+    "matrix": """
+        SELECT coalesce((SELECT revision FROM matrix_data
+                         WHERE establishment_id = ? AND year = ?), 0)
+    """,
+    "reports": """
+        SELECT coalesce((SELECT version FROM cache_versions WHERE resource = 'reports/' || ?), 0)
+            || '.' || coalesce((SELECT version FROM cache_versions WHERE resource = 'report_types'), 0)
+    """,
+    "establishments": """
+        SELECT coalesce((SELECT version FROM cache_versions WHERE resource = 'establishments'), 0)
+    """,
+}
+
+class ResponseCache:
+    def __init__(self, max_entries=RESPONSE_CACHE_ENTRIES):
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.not_modified = 0
+
+    def version(self, resource):
+        kind, *args = resource
+        return query_db(CACHE_VERSION_SQL[kind], args, one=True)[0]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "notModified": self.not_modified,
+            "entries": len(self._entries),
+            "maxEntries": self._max_entries,
+        }
+
+    def serve(self, resource, view):
+        usr = session["user"]
+        # cached bodies are only shared between users who can see the same data
+        scope = "admin" if usr["role"] == "admin" else f"etab{usr.get('establishmentId')}"
+        version = self.version(resource)
+        etag = "{}:{}:{}".format(scope, "/".join(map(str, resource)), version)
+        if request.if_none_match.contains(etag):
+            self.not_modified += 1
+            rv = Response(status=304)
+        else:
+            key = (scope, request.full_path)
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] == etag:
+                    self._entries.move_to_end(key)
+            if entry is not None and entry[0] == etag:
+                self.hits += 1
+                body = entry[1]
+            else:
+                self.misses += 1
+                if resource[0] == "establishments":
+                    # the directory may not have noticed the change yet
+                    establishments.sync(version)
+                rv = make_response(view())
+                if rv.status_code != 200 or rv.is_streamed or not rv.is_json:
+                    return rv
+                body = rv.get_data()
+                with self._lock:
+                    self._entries[key] = (etag, body)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self._max_entries:
+                        self._entries.popitem(last=False)
+            rv = Response(body, mimetype="application/json")
+        rv.set_etag(etag)
+        rv.headers["Cache-Control"] = "private, no-cache"
+        return rv
+
+response_cache = ResponseCache()
+
+def cached_response(resource):
+    """Cache GET responses; ``resource(*view_args)`` names what they depend on."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*a, **kw):
+            if request.method != "GET":
+                return fn(*a, **kw)
+            return response_cache.serve(resource(*a, **kw), lambda: fn(*a, **kw))
+        return wrapper
+    return decorator
+
 # --- auth -------------------------------------------------------------------
 
 @app.route("/login", methods=["POST"])
@@ -118,23 +780,87 @@ def list_etabs():
     codes = [f"etab_{i}" for i in range(1, 27)]
     return jsonify(etablissements=codes)
 
+# --- report file catalog ----------------------------------------------------
+#
+# report_files mirrors what is stored under FILES_ROOT so listings never walk
+# the directory tree. save_file() registers every upload; reconcile-files
+# repairs drift when files are added or removed behind the app's back.
+
+REPORT_PATH_RE = re.compile(r"^etab_(\d+)/(\d+)/([^/]+)/([^/]+)/([^/]+)$")
+
+REPORT_FILE_UPSERT_SQL = """
+    INSERT INTO report_files (
+        establishment_id, year, report, version, filename, stored_filepath, size, mtime, sha256
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(stored_filepath) DO UPDATE SET
+        size = excluded.size, mtime = excluded.mtime, sha256 = excluded.sha256,
+        uploaded_at = CURRENT_TIMESTAMP
+"""
+
+def register_report_file(con, id, year, report, version, filename, sha256=None):
+    rel = f"etab_{id}/{year}/{report}/{version}/{filename}"
+    st = os.stat(os.path.join(FILES_ROOT, rel))
+    con.execute(REPORT_FILE_UPSERT_SQL,
+                (id, year, report, version, filename, rel, st.st_size, st.st_mtime, sha256))
+    return rel
+
+def reconcile_report_files(con):
+    """Sync report_files with the files on disk; returns (added, updated, removed)."""
+    on_disk = {}
+    for root, _, fs in os.walk(FILES_ROOT):
+        for fn in fs:
+            rel = os.path.relpath(os.path.join(root, fn), FILES_ROOT).replace(os.sep, "/")
+            m = REPORT_PATH_RE.match(rel)
+            if m:
+                st = os.stat(os.path.join(root, fn))
+                on_disk[rel] = (m, st.st_size, st.st_mtime)
+
+    catalog = {r[0]: (r[1], r[2]) for r in con.execute(
+        "SELECT stored_filepath, size, mtime FROM report_files")}
+
+    added = updated = 0
+    for rel, (m, size, mtime) in on_disk.items():
+        if rel not in catalog:
+            added += 1
+        elif catalog[rel] != (size, mtime):
+            updated += 1
+        else:
+            continue
+        etab_id, year, report, version, filename = m.groups()
+        con.execute(REPORT_FILE_UPSERT_SQL,
+                    (int(etab_id), int(year), report, version, filename, rel, size, mtime, None))
+
+    removed = [rel for rel in catalog if rel not in on_disk]
+    con.executemany("DELETE FROM report_files WHERE stored_filepath = ?",
+                    [(rel,) for rel in removed])
+    return added, updated, len(removed)
+
+@app.cli.command("reconcile-files")
+def reconcile_files_command():
+    """Rescan FILES_ROOT and repair the report_files catalog."""
+    with pooled_connection() as con:
+        with con:
+            added, updated, removed = reconcile_report_files(con)
+    click.echo(f"report_files: {added} added, {updated} updated, {removed} removed")
+
+REPORT_FILES_LIST_SQL = """
+    SELECT stored_filepath FROM report_files
+    WHERE establishment_id = ? AND year = ? AND report = ? AND version = ?
+    ORDER BY filename
+"""
+
 @app.route(
     "/etablissement/insert/<int:id>/<int:year>/<report>/<version>",
     methods=["GET"]
 )
 @login_required
 def list_reports(id, year, report, version):
-    base = f"etablissements/etab_{id}/{year}/{report}/{version}"
-    os.makedirs(base, exist_ok=True)
-    files = []
-    for root, _, fs in os.walk(base):
-        for fn in fs:
-            files.append(os.path.relpath(os.path.join(root, fn), "etablissements"))
+    rows = query_db(REPORT_FILES_LIST_SQL, (id, year, report, version))
     usr = session["user"]
     return jsonify(
         id=id, year=year,
         report=report, version=version,
-        paths=files,
+        paths=[r[0] for r in rows],
         isAdmin=(usr["role"] == "admin")
     )
 
@@ -142,8 +868,7 @@ def list_reports(id, year, report, version):
 @login_required
 def save_file(id, year, report, version):
     # this should match your list_reports base
-    base = f"etablissements/etab_{id}/{year}/{report}/{version}"
-    os.makedirs(base, exist_ok=True)
+    base = f"{FILES_ROOT}/etab_{id}/{year}/{report}/{version}"
 
     if 'file' not in request.files:
         return jsonify(success=False, error="No file part"), 400
@@ -156,12 +881,622 @@ def save_file(id, year, report, version):
     if not file.filename.lower().endswith('.pdf'):
         return jsonify(success=False, error="Only PDFs allowed"), 400
 
+    con = get_db()
+    if pending_job_count(con) >= JOB_QUEUE_MAX:
+        return queue_full_response()
+
     # Prevent directory traversal
     filename = os.path.basename(file.filename)
-    filepath = os.path.join(base, filename)
-    file.save(filepath)
+    sha256, _ = store_blob(file.stream)
+    link_report_file(sha256, id, year, report, version, filename)
+
+    with con:
+        rel = register_report_file(con, id, year, report, version, filename, sha256)
+        job_id = enqueue_pdf_processing(con, sha256, id, rel)
+    if job_id is not None:
+        job_runner.notify()
+
+    return jsonify(success=True, filename=filename, sha256=sha256, jobId=job_id)
+
+# --- PDF delivery -----------------------------------------------------------
+
+# "x-sendfile" (Apache/lighttpd) or "x-accel" (nginx): Python only checks
+# access and validators, the proxy sends the bytes (ranges included).
+PDF_SENDFILE = os.environ.get("PDF_SENDFILE", "").lower()
+# nginx "internal" location that maps onto FILES_ROOT
+PDF_ACCEL_PREFIX = os.environ.get("PDF_ACCEL_PREFIX", "/protected-files/")
+# Files can be replaced in place by a new upload: always revalidate (cheap 304).
+PDF_CACHE_CONTROL = "private, no-cache"
+PDF_CACHE_IMMUTABLE = "private, max-age=31536000, immutable"
+
+@lru_cache(maxsize=4096)
+def file_sha256(rel, size, mtime):
+    """Content hash of a stored file, from the catalog or computed once."""
+    row = query_db(
+        "SELECT sha256 FROM report_files WHERE stored_filepath = ? AND size = ? AND mtime = ?",
+        (rel, size, mtime), one=True,
+    )
+    if row and row[0]:
+        return row[0]
+    hasher = hashlib.sha256()
+    with fs_timer("hash"), open(os.path.join(FILES_ROOT, rel), "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            hasher.update(chunk)
+    sha256 = hasher.hexdigest()
+    con = get_db()
+    with con:
+        con.execute(
+            "UPDATE report_files SET sha256 = ? WHERE stored_filepath = ? AND size = ? AND mtime = ?",
+            (sha256, rel, size, mtime),
+        )
+    return sha256
+
+# --- blob store & chunked uploads -------------------------------------------
+#
+# File contents live once under BLOB_ROOT/<sha[:2]>/<sha256>. The usual
+# etablissements/etab_{id}/{year}/{report}/{version}/<file> paths are hard
+# links to those blobs, so identical PDFs take no extra space and every
+# existing reader keeps working. Chunked uploads write to BLOB_ROOT/partial
+# as the bytes arrive and hash them in the same pass. Work on one upload is
+# serialized by an flock on BLOB_ROOT/partial/<id>.lock, so gunicorn worker
+# processes never append to, or move, a partial file another one is using.
+
+CHUNK_SIZE = 64 * 1024
+MAX_UPLOAD_BYTES = 512 * 1024 * 1024
+# Open uploads untouched for this long are dropped, partial bytes included.
+UPLOAD_EXPIRY_SECONDS = 24 * 3600
+# How often a process looks for them (on worker start, then on new uploads).
+UPLOAD_SWEEP_SECONDS = 3600
+
+# upload_id -> (offset, hasher) for uploads this process has been receiving.
+# Lost on restart; the hash is then recomputed from the partial file once.
+_upload_hashers = {}
+# in-process locks, used instead of flock where fcntl is missing (Windows)
+_upload_locks = {}
+_upload_lock = threading.Lock()
+_upload_last_sweep = [0.0]
+
+def blob_path(sha256):
+    return os.path.join(BLOB_ROOT, sha256[:2], sha256)
+
+def partial_path(upload_id):
+    return os.path.join(BLOB_ROOT, "partial", f"{upload_id}.part")
+
+def lock_path(upload_id):
+    return os.path.join(BLOB_ROOT, "partial", f"{upload_id}.lock")
+
+def commit_blob(tmp, sha256):
+    """Move a fully written temp file into the blob store (or drop a duplicate)."""
+    path = blob_path(sha256)
+    with fs_timer("commit"):
+        if os.path.exists(path):
+            os.remove(tmp)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp, path)
+    return path
+
+def store_blob(stream):
+    """Copy a stream into the blob store, hashing as it goes; returns (sha256, size)."""
+    tmp_dir = os.path.join(BLOB_ROOT, "partial")
+    os.makedirs(tmp_dir, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=tmp_dir, suffix=".part")
+    hasher, size = hashlib.sha256(), 0
+    with fs_timer("write"), os.fdopen(fd, "wb") as out:
+        while chunk := stream.read(CHUNK_SIZE):
+            hasher.update(chunk)
+            out.write(chunk)
+            size += len(chunk)
+    sha256 = hasher.hexdigest()
+    commit_blob(tmp, sha256)
+    return sha256, size
+
+def link_report_file(sha256, id, year, report, version, filename):
+    """Point etab_{id}/{year}/{report}/{version}/{filename} at a stored blob."""
+    base = f"{FILES_ROOT}/etab_{id}/{year}/{report}/{version}"
+    os.makedirs(base, exist_ok=True)
+    target = os.path.join(base, filename)
+    tmp = f"{target}.{secrets.token_hex(4)}.tmp"
+    with fs_timer("link"):
+        try:
+            os.link(blob_path(sha256), tmp)
+        except OSError:
+            # no hard links here (other device, FAT...): fall back to a copy
+            shutil.copyfile(blob_path(sha256), tmp)
+        os.replace(tmp, target)
+    return target
+
+@contextmanager
+def upload_lock(upload_id):
+    """Exclusive hold on one upload, across worker processes when fcntl exists."""
+    if fcntl is None:
+        with _upload_lock:
+            lock = _upload_locks.setdefault(upload_id, threading.Lock())
+        with lock:
+            yield
+        return
+    path = lock_path(upload_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    while True:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            with suppress(FileNotFoundError):
+                if os.fstat(fd).st_ino == os.stat(path).st_ino:
+                    break
+        except BaseException:
+            os.close(fd)
+            raise
+        # the holder we waited for removed the file (forget_upload): start over
+        os.close(fd)
+    try:
+        yield
+    finally:
+        os.close(fd)
 
-    return jsonify(success=True, filename=filename)
+def forget_upload(upload_id):
+    """Drop the lock file and this process's state of a finished or expired upload.
+
+    Call it with upload_lock() held.
+    """
+    with suppress(FileNotFoundError):
+        os.remove(lock_path(upload_id))
+    with _upload_lock:
+        _upload_locks.pop(upload_id, None)
+    _upload_hashers.pop(upload_id, None)
+
+def expire_uploads(con):
+    """Delete open uploads idle for UPLOAD_EXPIRY_SECONDS and stray partial files.
+
+    Returns the number of uploads removed.
+    """
+    _upload_last_sweep[0] = time.monotonic()
+    stale = [r[0] for r in con.execute(
+        "SELECT upload_id FROM uploads WHERE status = 'open' AND updated_at < datetime('now', ?)",
+        (f"-{UPLOAD_EXPIRY_SECONDS} seconds",),
+    )]
+    expired = 0
+    for upload_id in stale:
+        with upload_lock(upload_id):
+            with con:
+                # not if it was resumed since the SELECT
+                deleted = con.execute(
+                    "DELETE FROM uploads WHERE upload_id = ? AND status = 'open' "
+                    "AND updated_at < datetime('now', ?)",
+                    (upload_id, f"-{UPLOAD_EXPIRY_SECONDS} seconds"),
+                ).rowcount
+            if deleted:
+                with suppress(FileNotFoundError):
+                    os.remove(partial_path(upload_id))
+                forget_upload(upload_id)
+                expired += 1
+
+    # temp files of interrupted /saveFile requests, lock files left by a
+    # /complete that came late, and files of uploads whose row is gone
+    tmp_dir = os.path.join(BLOB_ROOT, "partial")
+    cutoff = time.time() - UPLOAD_EXPIRY_SECONDS
+    open_ids = {r[0] for r in con.execute("SELECT upload_id FROM uploads WHERE status = 'open'")}
+    for entry in os.scandir(tmp_dir) if os.path.isdir(tmp_dir) else ():
+        if entry.name.split(".")[0] in open_ids:
+            continue
+        with suppress(FileNotFoundError):
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+    return expired
+
+def upload_hasher(upload_id, offset):
+    """sha256 state covering the first ``offset`` bytes of a partial upload."""
+    state = _upload_hashers.get(upload_id)
+    if state and state[0] == offset:
+        return state[1]
+    hasher = hashlib.sha256()
+    with fs_timer("hash"), open(partial_path(upload_id), "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            hasher.update(chunk)
+    return hasher
+
+def load_upload(upload_id):
+    """The uploads row, or an error response if missing or not the user's."""
+    row = query_db("SELECT * FROM uploads WHERE upload_id = ?", (upload_id,), one=True)
+    if row is None:
+        return None, (jsonify(success=False, error="Upload introuvable"), 404)
+    usr = session["user"]
+    if usr["role"] == "establishment" and usr["establishmentId"] != row["establishment_id"]:
+        return None, (jsonify(success=False, error="Access denied to this establishment's reports"), 403)
+    return row, None
+
+def partial_missing_response(upload_id):
+    """409 for an upload whose partial file is gone: completed meanwhile, or lost."""
+    row = query_db("SELECT * FROM uploads WHERE upload_id = ?", (upload_id,), one=True)
+    if row is None:
+        return jsonify(success=False, error="Upload introuvable"), 404
+    if row["status"] == "complete":
+        return jsonify(success=False, error="Upload already completed",
+                       **upload_status(row, row["size"])), 409
+    # the bytes were moved by a completion that then failed: start again
+    return jsonify(success=False, error="Données de l'upload perdues, recommencez l'envoi",
+                   **upload_status(row, 0)), 409
+
+def upload_status(row, offset):
+    return {
+        "uploadId": row["upload_id"],
+        "offset": offset,
+        "size": row["size"],
+        "status": row["status"],
+        "sha256": row["sha256"],
+        "chunkSize": CHUNK_SIZE,
+    }
+
+@app.route("/api/uploads", methods=["POST"])
+@login_required
+def create_upload():
+    """Start a resumable upload.
+
+    Body: {"establishment": id or code, "year", "report", "version", "filename", "size"?}
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify(success=False, error="Invalid upload request"), 400
+    etab = data.get("establishment")
+    if isinstance(etab, int) and not isinstance(etab, bool):
+        etab_id = etab if establishments.by_id(etab) else None
+    else:
+        etab_id = establishments.id_for(str(etab))
+    if etab_id is None:
+        return jsonify(success=False, error="Établissement introuvable"), 404
+    usr = session["user"]
+    if usr["role"] == "establishment" and usr["establishmentId"] != etab_id:
+        return jsonify(success=False, error="Access denied to this establishment's reports"), 403
+
+    filename = os.path.basename(str(data.get("filename") or ""))
+    year, report, version = data.get("year"), data.get("report"), data.get("version")
+    size = data.get("size")
+    if not isinstance(year, int) or not report or not version or not filename:
+        return jsonify(success=False, error="Invalid upload request"), 400
+    if not filename.lower().endswith(".pdf"):
+        return jsonify(success=False, error="Only PDFs allowed"), 400
+    if size is not None and (not isinstance(size, int) or not 0 <= size <= MAX_UPLOAD_BYTES):
+        return jsonify(success=False, error="File too large"), 413
+
+    con = get_db()
+    if time.monotonic() - _upload_last_sweep[0] > UPLOAD_SWEEP_SECONDS:
+        expire_uploads(con)
+
+    upload_id = secrets.token_hex(16)
+    os.makedirs(os.path.dirname(partial_path(upload_id)), exist_ok=True)
+    open(partial_path(upload_id), "wb").close()
+    with con:
+        con.execute("""
+            INSERT INTO uploads (upload_id, establishment_id, year, report, version, filename, size)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (upload_id, etab_id, year, str(report), str(version), filename, size))
+    row = query_db("SELECT * FROM uploads WHERE upload_id = ?", (upload_id,), one=True)
+    return jsonify(upload_status(row, 0)), 201
+
+@app.route("/api/uploads/<upload_id>", methods=["GET"])
+@login_required
+def get_upload(upload_id):
+    row, error = load_upload(upload_id)
+    if error:
+        return error
+    if row["status"] == "complete":
+        return jsonify(upload_status(row, row["size"]))
+    try:
+        offset = os.path.getsize(partial_path(upload_id))
+    except FileNotFoundError:
+        return partial_missing_response(upload_id)
+    return jsonify(upload_status(row, offset))
+
+@app.route("/api/uploads/<upload_id>", methods=["PUT", "PATCH"])
+@login_required
+def append_upload(upload_id):
+    """Append the request body at ?offset= (or the Upload-Offset header).
+
+    The offset must equal the bytes already received; otherwise 409 with the
+    current offset so the client can resume from there.
+    """
+    row, error = load_upload(upload_id)
+    if error:
+        return error
+    if row["status"] != "open":
+        return jsonify(success=False, error="Upload already completed"), 409
+    offset = request.args.get("offset", type=int)
+    if offset is None:
+        offset = request.headers.get("Upload-Offset", type=int)
+
+    with upload_lock(upload_id):
+        path = partial_path(upload_id)
+        if not os.path.exists(path):
+            # completed while this request waited for the lock
+            return partial_missing_response(upload_id)
+        current = os.path.getsize(path)
+        if offset is not None and offset != current:
+            return jsonify(success=False, error="Offset mismatch", offset=current), 409
+        limit = row["size"] if row["size"] is not None else MAX_UPLOAD_BYTES
+
+        hasher = upload_hasher(upload_id, current)
+        written = current
+        with fs_timer("write"), open(path, "ab") as out:
+            while chunk := request.stream.read(CHUNK_SIZE):
+                if written + len(chunk) > limit:
+                    out.truncate(current)
+                    _upload_hashers.pop(upload_id, None)
+                    return jsonify(success=False, error="File too large", offset=current), 413
+                hasher.update(chunk)
+                out.write(chunk)
+                written += len(chunk)
+        _upload_hashers[upload_id] = (written, hasher)
+
+    con = get_db()
+    with con:
+        con.execute(
+            "UPDATE uploads SET received = ?, updated_at = CURRENT_TIMESTAMP WHERE upload_id = ?",
+            (written, upload_id),
+        )
+    return jsonify(upload_status(row, written))
+
+@app.route("/api/uploads/<upload_id>/complete", methods=["POST"])
+@login_required
+def complete_upload(upload_id):
+    """Finish an upload: verify size/hash, store the blob and link it in place.
+
+    An optional {"sha256": ...} body is checked against the received bytes.
+    """
+    row, error = load_upload(upload_id)
+    if error:
+        return error
+    if row["status"] == "complete":
+        return jsonify(upload_status(row, row["size"]))
+    body = request.get_json(silent=True) or {}
+    if not isinstance(body, dict) or not isinstance(body.get("sha256") or "", str):
+        return jsonify(success=False, error="Invalid upload request"), 400
+    expected = body.get("sha256")
+    if pending_job_count(get_db()) >= JOB_QUEUE_MAX:
+        return queue_full_response()
+
+    con = get_db()
+    # held until the row says complete, so a second /complete waits and then
+    # finds it done instead of looking for the partial file
+    with upload_lock(upload_id):
+        row = query_db("SELECT * FROM uploads WHERE upload_id = ?", (upload_id,), one=True)
+        if row is None:
+            return jsonify(success=False, error="Upload introuvable"), 404
+        if row["status"] == "complete":
+            forget_upload(upload_id)
+            return jsonify(upload_status(row, row["size"]))
+        path = partial_path(upload_id)
+        if not os.path.exists(path):
+            return partial_missing_response(upload_id)
+        received = os.path.getsize(path)
+        if row["size"] is not None and received != row["size"]:
+            return jsonify(success=False, error="Upload incomplete", offset=received), 409
+        sha256 = upload_hasher(upload_id, received).hexdigest()
+        if expected and expected.lower() != sha256:
+            return jsonify(success=False, error="Checksum mismatch", sha256=sha256), 422
+        commit_blob(path, sha256)
+
+        etab_id, year = row["establishment_id"], row["year"]
+        report, version, filename = row["report"], row["version"], row["filename"]
+        link_report_file(sha256, etab_id, year, report, version, filename)
+        with con:
+            rel = register_report_file(con, etab_id, year, report, version, filename, sha256)
+            job_id = enqueue_pdf_processing(con, sha256, etab_id, rel)
+            con.execute("""
+                UPDATE uploads SET status = 'complete', size = ?, received = ?, sha256 = ?,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE upload_id = ?
+            """, (received, received, sha256, upload_id))
+        forget_upload(upload_id)
+    if job_id is not None:
+        job_runner.notify()
+
+    row = query_db("SELECT * FROM uploads WHERE upload_id = ?", (upload_id,), one=True)
+    return jsonify({**upload_status(row, received), "jobId": job_id})
+
+@app.cli.command("expire-uploads")
+def expire_uploads_command():
+    """Delete abandoned uploads now instead of waiting for the next sweep."""
+    with pooled_connection() as con:
+        expired = expire_uploads(con)
+    click.echo(f"{expired} abandoned uploads removed")
+
+# --- background jobs --------------------------------------------------------
+#
+# The queue and its worker threads live in jobs.py; this process's runner is
+# created with the job handlers below. Here: the /api/jobs endpoints.
+
+def load_job(job_id):
+    """The jobs row, or an error response if missing or not the user's."""
+    row = query_db("SELECT * FROM jobs WHERE job_id = ?", (job_id,), one=True)
+    if row is None:
+        return None, (jsonify(success=False, error="Tâche introuvable"), 404)
+    usr = session["user"]
+    if usr["role"] == "establishment" and usr["establishmentId"] != row["establishment_id"]:
+        return None, (jsonify(success=False, error="Accès refusé"), 403)
+    return row, None
+
+@app.route("/api/jobs/<int:job_id>", methods=["GET"])
+@login_required
+def get_job(job_id):
+    row, error = load_job(job_id)
+    if error:
+        return error
+    return jsonify(job_status(row))
+
+@app.route("/api/jobs", methods=["GET"])
+@login_required
+def list_jobs():
+    """Newest jobs first: ?status=&limit=&cursor=. Establishment users see their own."""
+    usr = session["user"]
+    limit = min(max(request.args.get("limit", 50, type=int), 1), MAX_PAGE_SIZE)
+    where, args = [], []
+    if usr["role"] == "establishment":
+        where.append("establishment_id = ?")
+        args.append(usr["establishmentId"])
+    if "status" in request.args:
+        where.append("status = ?")
+        args.append(request.args["status"])
+    if "cursor" in request.args:
+        cursor = decode_cursor(request.args["cursor"])
+        if cursor is None or not isinstance(cursor[0], int):
+            return jsonify(success=False, error="Curseur invalide"), 400
+        where.append("job_id < ?")
+        args.append(cursor[0])
+    rows = query_db(
+        f"SELECT * FROM jobs {'WHERE ' + ' AND '.join(where) if where else ''} "
+        "ORDER BY job_id DESC LIMIT ?",
+        [*args, limit + 1],
+    )
+    page = rows[:limit]
+    return jsonify(
+        jobs=[job_status(r) for r in page],
+        pending=pending_job_count(get_db()), capacity=JOB_QUEUE_MAX,
+        nextCursor=encode_cursor(page[-1]["job_id"]) if len(rows) > limit else None,
+    )
+
+@app.route("/api/jobs/<int:job_id>/retry", methods=["POST"])
+@login_required
+def retry_job(job_id):
+    """Queue a failed job again with a fresh set of attempts (admin only)."""
+    if session["user"]["role"] != "admin":
+        return jsonify(success=False, error="Accès refusé"), 403
+    row, error = load_job(job_id)
+    if error:
+        return error
+    if row["status"] != "failed":
+        return jsonify(success=False, error="Seule une tâche en échec peut être relancée"), 409
+    con = get_db()
+    try:
+        with con:
+            con.execute("""
+                UPDATE jobs SET status = 'queued', attempts = 0, error = NULL, run_after = ?,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE job_id = ?
+            """, (time.time(), job_id))
+    except sqlite3.IntegrityError:
+        return jsonify(success=False, error="Une tâche identique est déjà en attente"), 409
+    job_runner.notify()
+    return jsonify(job_status(query_db("SELECT * FROM jobs WHERE job_id = ?", (job_id,), one=True)))
+
+def queue_full_response():
+    """503 for uploads while the job queue is at capacity."""
+    response = jsonify(success=False, error="Serveur occupé, réessayez dans un instant")
+    response.headers["Retry-After"] = str(int(JOB_POLL_SECONDS * 15))
+    return response, 503
+
+# --- PDF processing ---------------------------------------------------------
+#
+# Every stored upload gets a process_pdf job (see pdfs.py). Results are kept
+# per content hash in pdf_documents, so a blob shared by several report
+# files is processed once; the extracted text is indexed for /api/search.
+
+def preview_path(sha256):
+    return os.path.join(BLOB_ROOT, "previews", sha256[:2], f"{sha256}.png")
+
+PDF_DOCUMENT_UPSERT_SQL = """
+    INSERT INTO pdf_documents (sha256, valid, pages, text, preview, error)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(sha256) DO UPDATE SET
+        valid = excluded.valid, pages = excluded.pages, text = excluded.text,
+        preview = excluded.preview, error = excluded.error, processed_at = CURRENT_TIMESTAMP
+"""
+
+def process_pdf(payload):
+    """Job handler: inspect one stored PDF and record what it found."""
+    sha256 = payload["sha256"]
+    with pooled_connection() as con:
+        done = con.execute(
+            "SELECT valid, pages, preview FROM pdf_documents WHERE sha256 = ?", (sha256,)
+        ).fetchone()
+    if done:
+        return {"sha256": sha256, "valid": bool(done[0]), "pages": done[1], "preview": bool(done[2])}
+
+    path = blob_path(sha256)
+    if not os.path.exists(path):
+        # files registered before the blob store only exist under FILES_ROOT
+        path = os.path.join(FILES_ROOT, payload["path"])
+    found = inspect_pdf(path, preview_path(sha256))
+    preview = os.path.relpath(preview_path(sha256), BLOB_ROOT) if found["preview"] else None
+
+    with pooled_connection() as con:
+        with con:
+            con.execute(PDF_DOCUMENT_UPSERT_SQL, (
+                sha256, int(found["valid"]), found["pages"], found["text"], preview, found["error"],
+            ))
+    return {"sha256": sha256, "valid": found["valid"], "pages": found["pages"],
+            "textChars": len(found["text"]), "preview": found["preview"], "error": found["error"]}
+
+def enqueue_pdf_processing(con, sha256, id, rel):
+    """process_pdf job for a newly registered file, unless its blob was already done."""
+    if con.execute("SELECT 1 FROM pdf_documents WHERE sha256 = ?", (sha256,)).fetchone():
+        return None
+    return enqueue_job(con, "process_pdf", f"{sha256}:{id}", {"sha256": sha256, "path": rel}, id)
+
+JOB_HANDLERS = {
+    "process_pdf": process_pdf,
+}
+
+job_runner = JobRunner(pooled_connection, JOB_HANDLERS, logger=app.logger)
+
+def load_document(sha256):
+    """The pdf_documents row if the user may see a file with this content."""
+    usr = session["user"]
+    if usr["role"] == "establishment":
+        visible = query_db(
+            "SELECT 1 FROM report_files WHERE sha256 = ? AND establishment_id = ? LIMIT 1",
+            (sha256, usr["establishmentId"]), one=True,
+        )
+        if not visible:
+            return None
+    return query_db("SELECT * FROM pdf_documents WHERE sha256 = ?", (sha256,), one=True)
+
+@app.route("/api/documents/<sha256>", methods=["GET"])
+@login_required
+def get_document(sha256):
+    """Processing results for a stored PDF (404 until its job has run)."""
+    row = load_document(sha256)
+    if row is None:
+        return jsonify(success=False, error="Document introuvable"), 404
+    return jsonify(
+        sha256=row["sha256"], valid=bool(row["valid"]), pages=row["pages"],
+        textChars=len(row["text"] or ""), preview=row["preview"] is not None,
+        error=row["error"], processedAt=row["processed_at"],
+    )
+
+@app.route("/api/documents/<sha256>/preview", methods=["GET"])
+@login_required
+def get_document_preview(sha256):
+    row = load_document(sha256)
+    if row is None or row["preview"] is None:
+        return jsonify(success=False, error="Aperçu indisponible"), 404
+    response = send_file(os.path.join(BLOB_ROOT, row["preview"]), mimetype="image/png",
+                         conditional=True, max_age=None)
+    # content-addressed: the preview for a hash never changes
+    response.headers["Cache-Control"] = PDF_CACHE_IMMUTABLE
+    return response
+
+@app.cli.command("process-pdfs")
+def process_pdfs_command():
+    """Queue processing for every catalogued file whose content was never processed."""
+    queued = 0
+    with pooled_connection() as con:
+        rows = con.execute("""
+            SELECT f.establishment_id, f.stored_filepath, f.size, f.mtime, f.sha256
+            FROM report_files f LEFT JOIN pdf_documents d ON d.sha256 = f.sha256
+            WHERE d.document_id IS NULL
+        """).fetchall()
+        for etab_id, rel, size, mtime, sha256 in rows:
+            if sha256 is None:
+                hasher = hashlib.sha256()
+                with open(os.path.join(FILES_ROOT, rel), "rb") as f:
+                    while chunk := f.read(CHUNK_SIZE):
+                        hasher.update(chunk)
+                sha256 = hasher.hexdigest()
+            with con:
+                con.execute("UPDATE report_files SET sha256 = ? WHERE stored_filepath = ?", (sha256, rel))
+                if enqueue_pdf_processing(con, sha256, etab_id, rel) is not None:
+                    queued += 1
+    click.echo(f"{queued} jobs queued; running servers pick them up")
 
 # Accept a string code instead of an int id:
 @app.route(
@@ -170,15 +1505,10 @@ def save_file(id, year, report, version):
 )
 @login_required
 def list_reports_by_code(code, year, report, version):
-    # look up the numeric id
-    row = query_db(
-      "SELECT establishment_id FROM establishments WHERE code = ?",
-      (code,),
-      one=True
-    )
-    if not row:
+    etab_id = establishments.id_for(code)
+    if etab_id is None:
         return jsonify(error="Etablissement introuvable"), 404
-    return list_reports(row[0], year, report, version)
+    return list_reports(etab_id, year, report, version)
 
 
 @app.route(
@@ -187,14 +1517,10 @@ def list_reports_by_code(code, year, report, version):
 )
 @login_required
 def save_file_by_code(code, year, report, version):
-    row = query_db(
-      "SELECT establishment_id FROM establishments WHERE code = ?",
-      (code,),
-      one=True
-    )
-    if not row:
+    etab_id = establishments.id_for(code)
+    if etab_id is None:
         return jsonify(error="Etablissement introuvable"), 404
-    return save_file(row[0], year, report, version)
+    return save_file(etab_id, year, report, version)
 
 
 @app.route(
@@ -203,34 +1529,44 @@ def save_file_by_code(code, year, report, version):
 )
 @login_required
 def serve_pdf_by_code(code, year, report, version, filename):
-    row = query_db(
-      "SELECT establishment_id FROM establishments WHERE code = ?",
-      (code,),
-      one=True
-    )
-    if not row:
+    etab_id = establishments.id_for(code)
+    if etab_id is None:
         return jsonify(error="Etablissement introuvable"), 404
-    return send_from_directory(
-      f"etablissements/etab_{row[0]}/{year}/{report}/{version}",
-      filename,
-      as_attachment=False
-    )
+    return serve_pdf(etab_id, year, report, version, filename)
+
+def establishments_page_sql(keyset):
+    where = "WHERE name > ? " if keyset else ""
+    return f"SELECT name, code FROM establishments {where}ORDER BY name LIMIT ?"
 
 @app.route("/api/establishments", methods=["GET"])
 @login_required
+@cached_response(lambda: ("establishments",))
 def api_establishments():
-    rows = query_db("SELECT code, name FROM establishments ORDER BY name")
-    data = [{"key": code, "label": name} for code, name in rows]
-    return jsonify(establishments=data)
+    """Every establishment by name, or one page of them with ?limit=&cursor=."""
+    limit = request.args.get("limit", type=int)
+    if limit is None:
+        return jsonify(establishments=establishments.listing())
+    limit = min(max(limit, 1), MAX_PAGE_SIZE)
+    after = None
+    if "cursor" in request.args:
+        cursor = decode_cursor(request.args["cursor"])
+        if cursor is None or not isinstance(cursor[0], str):
+            return jsonify(success=False, error="Curseur invalide"), 400
+        after = cursor[0]
+    rows = query_db(establishments_page_sql(after is not None),
+                    [*([after] if after is not None else []), limit + 1])
+    page = rows[:limit]
+    return jsonify(
+        establishments=[{"key": r["code"], "label": r["name"]} for r in page],
+        nextCursor=encode_cursor(page[-1]["name"]) if len(rows) > limit else None,
+    )
 
 # --- FIXED: Route now accepts string code instead of integer ID ---
 @app.route("/api/etablissement/<code>", methods=["GET"])
 @login_required
+@cached_response(lambda code: ("establishments",))
 def etablissement_info(code):
-    row = query_db(
-        "SELECT establishment_id, name, code FROM establishments WHERE code = ?", # Query by code, fetch ID
-        (code,), one=True
-    )
+    row = establishments.by_code(code)
     if not row:
         return jsonify(success=False, error="Établissement introuvable"), 404
     # Return ID, label (name), key (code)
@@ -238,11 +1574,9 @@ def etablissement_info(code):
 
 @app.route("/api/etablissement/<int:id>", methods=["GET"])
 @login_required
+@cached_response(lambda id: ("establishments",))
 def etablissement_info_by_id(id):
-    row = query_db(
-        "SELECT establishment_id, name, code FROM establishments WHERE establishment_id = ?",
-        (id,), one=True
-    )
+    row = establishments.by_id(id)
     if not row:
         return jsonify(success=False, error="Établissement introuvable"), 404
     return jsonify(
@@ -261,13 +1595,396 @@ def api_years():
 )
 @login_required
 def serve_pdf(id, year, report, version, filename):
-    folder = f"etablissements/etab_{id}/{year}/{report}/{version}"
-    return send_from_directory(folder, filename, as_attachment=False)
+    """Send a stored PDF with a content-hash ETag.
+
+    Handles If-None-Match / If-Modified-Since (304) and Range (206). With
+    PDF_SENDFILE set, the bytes are left to the front proxy instead.
+    """
+    rel = werkzeug.security.safe_join(f"etab_{id}/{year}/{report}/{version}", filename)
+    path = rel and os.path.abspath(os.path.join(FILES_ROOT, rel))
+    with fs_timer("stat"):
+        st = os.stat(path) if path and os.path.isfile(path) else None
+    if st is None:
+        return jsonify(success=False, error="Fichier introuvable"), 404
+
+    etag = file_sha256(rel, st.st_size, st.st_mtime)
+
+    if PDF_SENDFILE:
+        rv = Response(mimetype="application/pdf")
+        if PDF_SENDFILE == "x-accel":
+            rv.headers["X-Accel-Redirect"] = PDF_ACCEL_PREFIX + quote(rel)
+        else:
+            rv.headers["X-Sendfile"] = path
+        rv.set_etag(etag)
+        rv.last_modified = st.st_mtime
+        rv = rv.make_conditional(request)
+    else:
+        # the body itself is written by the server (sendfile where it can)
+        with fs_timer("open"):
+            rv = send_file(path, mimetype="application/pdf", conditional=True,
+                           etag=etag, last_modified=st.st_mtime)
+        # advertised up front so PDF viewers switch to range loading
+        rv.headers["Accept-Ranges"] = "bytes"
+
+    # ?v=<sha256> URLs never change content, so those can be cached for good.
+    if request.args.get("v") == etag:
+        rv.headers["Cache-Control"] = PDF_CACHE_IMMUTABLE
+    else:
+        rv.headers["Cache-Control"] = PDF_CACHE_CONTROL
+    return rv
 
 # --- matrix endpoints -------------------------------------------------------
 
+MATRIX_CELLS = [f"{r}_{c}" for r in ROWS for c in COLS]
+BULK_FETCH_SIZE = 500
+
+# Built once so sqlite3's statement cache always sees the same SQL text.
+MATRIX_UPSERT_SQL = f"""
+    INSERT INTO matrix_data (
+        establishment_id, year, {", ".join(MATRIX_CELLS)}, revision
+    ) VALUES (
+        ?, ?, {", ".join("?" for _ in MATRIX_CELLS)}, 1
+    )
+    ON CONFLICT(establishment_id, year)
+    DO UPDATE SET
+        {", ".join(f"{cell}=excluded.{cell}" for cell in MATRIX_CELLS)},
+        revision = matrix_data.revision + 1
+"""
+MATRIX_ROW_SQL = f"""
+    SELECT revision, {", ".join(MATRIX_CELLS)} FROM matrix_data
+    WHERE establishment_id = ? AND year = ?
+"""
+
+def is_cell_value(value):
+    """Cells hold text or numbers (None for empty); anything else is rejected."""
+    return value is None or (isinstance(value, (str, int, float)) and not isinstance(value, bool))
+
+def matrix_values(payload):
+    """Flatten {row: [6 values]} into MATRIX_CELLS order, or None if malformed."""
+    if not isinstance(payload, dict):
+        return None
+    values = []
+    for row in ROWS:
+        vals = payload.get(row)
+        if (not isinstance(vals, list) or len(vals) != len(COLS)
+                or not all(is_cell_value(v) for v in vals)):
+            return None
+        values.extend(vals)
+    return values
+
+# --- matrix rollups ---------------------------------------------------------
+#
+# matrix_*_stats hold running counts of filled cells so /api/stats never has
+# to scan matrix_data. Every write goes through save_matrices(), which applies
+# the deltas in the caller's transaction; rebuild_matrix_stats() recomputes
+# them from scratch.
+
+MATRIX_KEYS_SELECT_SQL = f"""
+    SELECT establishment_id, year, revision, {", ".join(MATRIX_CELLS)}
+    FROM matrix_data
+    WHERE (establishment_id, year) IN (
+        SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]')
+        FROM json_each(?)
+    )
+"""
+
+def is_filled(value):
+    return value is not None and str(value).strip() != ""
+
+class MatrixStatsDelta:
+    def __init__(self):
+        self.cells = dict.fromkeys(MATRIX_CELLS, 0)
+        self.years = {}
+        self.establishments = {}
+
+    def add(self, etab_id, year, old, new):
+        """Account for one matrix going from ``old`` (None if new) to ``new``."""
+        old_mask = [is_filled(v) for v in old] if old is not None else [False] * len(MATRIX_CELLS)
+        new_mask = [is_filled(v) for v in new]
+        matrices = 0 if old is not None else 1
+        filled = sum(new_mask) - sum(old_mask)
+        for cell, was, now in zip(MATRIX_CELLS, old_mask, new_mask):
+            self.cells[cell] += now - was
+        for bucket, key in ((self.years, year), (self.establishments, etab_id)):
+            m, f = bucket.get(key, (0, 0))
+            bucket[key] = (m + matrices, f + filled)
+
+    def apply(self, con):
+        con.executemany(
+            "INSERT INTO matrix_cell_stats (cell, filled) VALUES (?, ?) "
+            "ON CONFLICT(cell) DO UPDATE SET filled = filled + excluded.filled",
+            [(cell, n) for cell, n in self.cells.items() if n],
+        )
+        con.executemany(
+            "INSERT INTO matrix_year_stats (year, matrices, filled_cells) VALUES (?, ?, ?) "
+            "ON CONFLICT(year) DO UPDATE SET matrices = matrices + excluded.matrices, "
+            "filled_cells = filled_cells + excluded.filled_cells",
+            [(year, m, f) for year, (m, f) in self.years.items() if m or f],
+        )
+        con.executemany(
+            "INSERT INTO matrix_establishment_stats (establishment_id, matrices, filled_cells) "
+            "VALUES (?, ?, ?) ON CONFLICT(establishment_id) DO UPDATE SET "
+            "matrices = matrices + excluded.matrices, "
+            "filled_cells = filled_cells + excluded.filled_cells",
+            [(etab_id, m, f) for etab_id, (m, f) in self.establishments.items() if m or f],
+        )
+
+def save_matrices(con, params):
+    """Upsert [id, year, *values] rows, log changed cells and update the rollups.
+
+    Rows identical to the stored matrix are skipped. Call it first thing in
+    the caller's `with con:` block: it takes the write lock before reading,
+    so concurrent saves never diff against a stale row. Returns
+    {(id, year): revision}.
+    """
+    con.execute("BEGIN IMMEDIATE")
+    keys = json.dumps([[p[0], p[1]] for p in params])
+    current = {
+        (r[0], r[1]): (r[2], list(r[3:]))
+        for r in con.execute(MATRIX_KEYS_SELECT_SQL, (keys,))
+    }
+    delta = MatrixStatsDelta()
+    writes, changes = [], []
+    for etab_id, year, *values in params:
+        revision, old = current.get((etab_id, year), (0, None))
+        changed = changed_cells(old, values)
+        if old is not None and not changed:
+            continue
+        revision += 1
+        delta.add(etab_id, year, old, values)
+        writes.append([etab_id, year, *values])
+        changes.extend((etab_id, year, revision, cell, value) for cell, value in changed)
+        current[(etab_id, year)] = (revision, values)
+    con.executemany(MATRIX_UPSERT_SQL, writes)
+    log_matrix_changes(con, changes)
+    delta.apply(con)
+    return {key: revision for key, (revision, _) in current.items()}
+
+# --- matrix change log ------------------------------------------------------
+#
+# Every matrix write bumps matrix_data.revision and appends the cells it
+# changed to matrix_changes. Clients send the revision they saw with a cell
+# PATCH (409 if it moved on) and pull deltas from the /changes feed. Only the
+# last MATRIX_CHANGE_HISTORY revisions of each matrix are kept.
+
+MATRIX_CHANGE_HISTORY = 500
+MATRIX_FEED_MAX_WAIT = 10.0
+# Long-polls a worker process holds at once; each one ties up a server
+# thread, so keep this under WEB_THREADS. Past it /changes answers at once.
+MATRIX_FEED_WAITERS = int(os.environ.get("MATRIX_FEED_WAITERS", 2))
+MATRIX_CHANGES_SQL = """
+    SELECT cell, value FROM matrix_changes
+    WHERE establishment_id = ? AND year = ? AND revision > ? AND revision <= ?
+    ORDER BY revision
+"""
+
+def cell_text(value):
+    return "" if value is None else str(value)
+
+def changed_cells(old, new):
+    """[(cell, value)] where ``new`` differs from ``old`` (None: no matrix yet)."""
+    old = old or [None] * len(MATRIX_CELLS)
+    return [
+        (cell, value)
+        for cell, was, value in zip(MATRIX_CELLS, old, new)
+        if cell_text(was) != cell_text(value)
+    ]
+
+def log_matrix_changes(con, changes):
+    """Append (id, year, revision, cell, value) rows and trim old revisions."""
+    con.executemany(
+        "INSERT INTO matrix_changes (establishment_id, year, revision, cell, value) "
+        "VALUES (?, ?, ?, ?, ?)",
+        changes,
+    )
+    latest = {}
+    for etab_id, year, revision, _, _ in changes:
+        latest[(etab_id, year)] = revision
+    con.executemany(
+        "DELETE FROM matrix_changes WHERE establishment_id = ? AND year = ? AND revision <= ?",
+        [(e, y, r - MATRIX_CHANGE_HISTORY) for (e, y), r in latest.items() if r > MATRIX_CHANGE_HISTORY],
+    )
+
+class MatrixFeed:
+    """Wakes this process's long-polling /changes requests after a matrix write.
+
+    Writes from other processes are picked up by re-reading the revision every
+    DATA_VERSION_CHECK_SECONDS. At most ``waiters`` requests wait at a time.
+    """
+
+    def __init__(self, waiters):
+        self._cond = threading.Condition()
+        self._slots = threading.BoundedSemaphore(waiters)
+        self.seq = 0
+
+    def hold(self):
+        """Take a waiting slot without blocking; False if all are in use."""
+        return self._slots.acquire(blocking=False)
+
+    def release(self):
+        self._slots.release()
+
+    def notify(self):
+        with self._cond:
+            self.seq += 1
+            self._cond.notify_all()
+
+    def wait(self, seen, timeout):
+        with self._cond:
+            if self.seq == seen:
+                self._cond.wait(timeout)
+
+matrix_feed = MatrixFeed(MATRIX_FEED_WAITERS)
+
+def compute_matrix_stats(con):
+    """Full recomputation: ({cell: filled}, {year: (m, f)}, {id: (m, f)})."""
+    delta = MatrixStatsDelta()
+    cur = con.execute(f"SELECT establishment_id, year, {', '.join(MATRIX_CELLS)} FROM matrix_data")
+    while True:
+        batch = cur.fetchmany(BULK_FETCH_SIZE)
+        if not batch:
+            break
+        for r in batch:
+            delta.add(r[0], r[1], None, list(r[2:]))
+    cells = {cell: n for cell, n in delta.cells.items() if n}
+    return cells, delta.years, delta.establishments
+
+def read_matrix_stats(con):
+    """Current rollups in the same shape as compute_matrix_stats()."""
+    cells = {r[0]: r[1] for r in con.execute("SELECT cell, filled FROM matrix_cell_stats") if r[1]}
+    years = {r[0]: (r[1], r[2]) for r in con.execute(
+        "SELECT year, matrices, filled_cells FROM matrix_year_stats") if r[1] or r[2]}
+    etabs = {r[0]: (r[1], r[2]) for r in con.execute(
+        "SELECT establishment_id, matrices, filled_cells FROM matrix_establishment_stats") if r[1] or r[2]}
+    return cells, years, etabs
+
+def rebuild_matrix_stats(con):
+    """Replace the rollups with a full recomputation (caller commits)."""
+    cells, years, etabs = compute_matrix_stats(con)
+    con.execute("DELETE FROM matrix_cell_stats")
+    con.execute("DELETE FROM matrix_year_stats")
+    con.execute("DELETE FROM matrix_establishment_stats")
+    con.executemany("INSERT INTO matrix_cell_stats (cell, filled) VALUES (?, ?)", cells.items())
+    con.executemany(
+        "INSERT INTO matrix_year_stats (year, matrices, filled_cells) VALUES (?, ?, ?)",
+        [(y, m, f) for y, (m, f) in years.items()],
+    )
+    con.executemany(
+        "INSERT INTO matrix_establishment_stats (establishment_id, matrices, filled_cells) "
+        "VALUES (?, ?, ?)",
+        [(e, m, f) for e, (m, f) in etabs.items()],
+    )
+
+@app.cli.command("rebuild-stats")
+@click.option("--check", is_flag=True,
+              help="Only compare the stored rollups with a full recomputation.")
+def rebuild_stats_command(check):
+    """Recompute the matrix rollups from matrix_data."""
+    with pooled_connection() as con:
+        if check:
+            if read_matrix_stats(con) != compute_matrix_stats(con):
+                raise click.ClickException("matrix rollups are out of date")
+            click.echo("matrix rollups match matrix_data")
+            return
+        with con:
+            rebuild_matrix_stats(con)
+    click.echo("matrix rollups rebuilt")
+
+def completion(filled, matrices):
+    cells = matrices * len(MATRIX_CELLS)
+    return round(filled / cells, 4) if cells else 0.0
+
+def establishment_stats_entry(etab_id, matrices, filled):
+    known = establishments.by_id(etab_id)
+    return {
+        "id": etab_id,
+        "key": known[2] if known else None,
+        "label": known[1] if known else None,
+        "matrices": matrices,
+        "filledCells": filled,
+        "completion": completion(filled, matrices),
+    }
+
+ESTABLISHMENT_STATS_PAGE_SQL = """
+    SELECT establishment_id, matrices, filled_cells FROM matrix_establishment_stats
+    WHERE matrices > 0 AND establishment_id > ?
+    ORDER BY establishment_id LIMIT ?
+"""
+
+@app.route("/api/stats", methods=["GET"])
+@login_required
+def api_stats():
+    """Portfolio fill rates from the rollup tables.
+
+    Totals only, so the response does not grow with the number of
+    establishments; /api/stats/establishments pages through those.
+    Establishment users only get the entry for their own establishment.
+    """
+    usr = session["user"]
+    con = get_db()
+
+    if usr["role"] == "establishment":
+        row = con.execute(
+            "SELECT matrices, filled_cells FROM matrix_establishment_stats WHERE establishment_id = ?",
+            (usr["establishmentId"],),
+        ).fetchone()
+        matrices, filled = row if row else (0, 0)
+        return jsonify(establishments=[establishment_stats_entry(usr["establishmentId"], matrices, filled)])
+
+    years = con.execute(
+        "SELECT year, matrices, filled_cells FROM matrix_year_stats WHERE matrices > 0 ORDER BY year"
+    ).fetchall()
+    total = sum(r[1] for r in years)
+    filled_total = sum(r[2] for r in years)
+    cells = dict(con.execute("SELECT cell, filled FROM matrix_cell_stats").fetchall())
+
+    return jsonify(
+        matrices=total,
+        filledCells=filled_total,
+        completion=completion(filled_total, total),
+        cellFillRates={
+            r: {c: round(cells.get(f"{r}_{c}", 0) / total, 4) if total else 0.0 for c in COLS}
+            for r in ROWS
+        },
+        years=[
+            {"year": y, "matrices": m, "filledCells": f, "completion": completion(f, m)}
+            for y, m, f in years
+        ],
+        columns=COLS, rows=ROWS,
+    )
+
+@app.route("/api/stats/establishments", methods=["GET"])
+@login_required
+def api_stats_establishments():
+    """Fill rates per establishment by id, paged with ?limit=&cursor=.
+
+    Establishment users only get their own establishment.
+    """
+    usr = session["user"]
+    limit = min(max(request.args.get("limit", 50, type=int), 1), MAX_PAGE_SIZE)
+    after = 0
+    if "cursor" in request.args:
+        cursor = decode_cursor(request.args["cursor"])
+        if cursor is None or not isinstance(cursor[0], int):
+            return jsonify(success=False, error="Curseur invalide"), 400
+        after = cursor[0]
+    if usr["role"] == "establishment":
+        rows = query_db(
+            "SELECT establishment_id, matrices, filled_cells FROM matrix_establishment_stats "
+            "WHERE establishment_id = ? AND establishment_id > ?",
+            (usr["establishmentId"], after),
+        )
+    else:
+        rows = query_db(ESTABLISHMENT_STATS_PAGE_SQL, (after, limit + 1))
+    page = rows[:limit]
+    return jsonify(
+        establishments=[establishment_stats_entry(*r) for r in page],
+        nextCursor=encode_cursor(page[-1][0]) if len(rows) > limit else None,
+    )
+
 @app.route("/etablissement/<int:id>/<int:year>/matrix", methods=["GET", "POST"])
 @login_required
+@cached_response(lambda id, year: ("matrix", id, year))
 def matrix(id, year):
     # --- Permission Check --- 
     # Allow admin access to any matrix
@@ -281,28 +1998,15 @@ def matrix(id, year):
     cur = con.cursor()
 
     if request.method == "POST":
-        payload = request.get_json() or {}
-        # On fait un upsert pour chaque ligne (AE, CE, IGF, CC)
-        for row in ROWS:
-            vals = payload.get(row, [])  # liste de 6 valeurs
-            # Remplacez placeholders et colonnes dynamiquement
-            cols_sql       = ", ".join(f"{row}_{c}" for c in COLS)
-            placeholders   = ", ".join("?" for _ in COLS)
-            updates_sql    = ", ".join(f"{row}_{c}=excluded.{row}_{c}" for c in COLS)
-
-            cur.execute(f"""
-                INSERT INTO matrix_data (
-                    establishment_id, year, {cols_sql}
-                ) VALUES (
-                    ?, ?, {placeholders}
-                )
-                ON CONFLICT(establishment_id, year)
-                DO UPDATE SET
-                    {updates_sql}
-            """, [id, year, *vals])
-
-        con.commit()
-        return jsonify(success=True)
+        payload = request.get_json(silent=True) or {}
+        values = matrix_values(payload)
+        if values is None:
+            return jsonify(success=False, error="Invalid matrix payload"), 400
+        # un seul upsert pour les 4 lignes (AE, CE, IGF, CC)
+        with con:
+            revisions = save_matrices(con, [[id, year, *values]])
+        matrix_feed.notify()
+        return jsonify(success=True, revision=revisions[(id, year)])
 
     # --- GET: on lit la ligne existante ---
     cur.execute(
@@ -320,52 +2024,507 @@ def matrix(id, year):
             for r in ROWS
         }
 
-    return jsonify(id=id, year=year, matrix=matrix, columns=COLS, rows=ROWS)
+    return jsonify(id=id, year=year, matrix=matrix, columns=COLS, rows=ROWS,
+                   revision=row["revision"] if row else 0)
+
+@app.route("/etablissement/<int:id>/<int:year>/matrix", methods=["PATCH"])
+@login_required
+def patch_matrix(id, year):
+    """Update some cells: {"revision": n, "cells": {"AE_IC": "...", ...}}.
+
+    ``revision`` is the one the client last saw (0 if the matrix did not exist
+    yet). If the matrix has moved on since, nothing is written and the 409
+    carries the current revision and matrix.
+    """
+    usr = session["user"]
+    if usr["role"] == "establishment" and usr["establishmentId"] != id:
+        return jsonify(success=False, error="Access denied to this establishment's matrix"), 403
+
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify(success=False, error="Invalid matrix patch"), 400
+    cells, expected = payload.get("cells"), payload.get("revision")
+    if (not isinstance(cells, dict) or not cells
+            or not isinstance(expected, int) or isinstance(expected, bool)
+            or any(cell not in MATRIX_CELLS or not is_cell_value(value)
+                   for cell, value in cells.items())):
+        return jsonify(success=False, error="Invalid matrix patch"), 400
+
+    con = get_db()
+    with con:
+        # taken before reading so nobody writes between the check and the update
+        con.execute("BEGIN IMMEDIATE")
+        row = con.execute(MATRIX_ROW_SQL, (id, year)).fetchone()
+        revision = row[0] if row else 0
+        if revision != expected:
+            matrix = matrix_from_row(row, 1) if row else {r: [""] * len(COLS) for r in ROWS}
+            return jsonify(success=False, error="Conflit de révision",
+                           revision=revision, matrix=matrix), 409
+
+        old = list(row[1:]) if row else None
+        values = list(old or [None] * len(MATRIX_CELLS))
+        for cell, value in cells.items():
+            values[MATRIX_CELLS.index(cell)] = value
+        changed = changed_cells(old, values)
+        if row is not None and not changed:
+            return jsonify(success=True, revision=revision, changed=[])
+
+        revision += 1
+        if row is None:
+            con.execute(MATRIX_UPSERT_SQL, [id, year, *values])
+        else:
+            # only the changed columns
+            con.execute(
+                f"UPDATE matrix_data SET {', '.join(f'{cell} = ?' for cell, _ in changed)}, "
+                "revision = ? WHERE establishment_id = ? AND year = ?",
+                [*(value for _, value in changed), revision, id, year],
+            )
+        delta = MatrixStatsDelta()
+        delta.add(id, year, old, values)
+        delta.apply(con)
+        log_matrix_changes(con, [(id, year, revision, cell, value) for cell, value in changed])
+    matrix_feed.notify()
+    return jsonify(success=True, revision=revision, changed=[cell for cell, _ in changed])
+
+@app.route("/etablissement/<int:id>/<int:year>/matrix/changes", methods=["GET"])
+@login_required
+def matrix_changes(id, year):
+    """Cells changed since ?since=<revision>, each with its latest value.
+
+    ?wait=<seconds> (at most MATRIX_FEED_MAX_WAIT) holds the request until
+    something changes (long-poll), unless MATRIX_FEED_WAITERS requests are
+    already waiting: then it answers straight away and the client backs off.
+    reset=true means the log does not go back that far: fetch the whole
+    matrix again.
+    """
+    usr = session["user"]
+    if usr["role"] == "establishment" and usr["establishmentId"] != id:
+        return jsonify(success=False, error="Access denied to this establishment's matrix"), 403
+
+    since = request.args.get("since", type=int)
+    if since is None:
+        return jsonify(success=False, error="Paramètre since manquant"), 400
+    wait = min(max(request.args.get("wait", 0.0, type=float), 0.0), MATRIX_FEED_MAX_WAIT)
+    held = wait > 0 and matrix_feed.hold()
+    deadline = time.monotonic() + (wait if held else 0)
+
+    try:
+        while True:
+            seen = matrix_feed.seq
+            row = query_db(
+                "SELECT revision FROM matrix_data WHERE establishment_id = ? AND year = ?",
+                (id, year), one=True,
+            )
+            revision = row[0] if row else 0
+            remaining = deadline - time.monotonic()
+            if revision != since or remaining <= 0:
+                break
+            matrix_feed.wait(seen, min(remaining, DATA_VERSION_CHECK_SECONDS))
+    finally:
+        if held:
+            matrix_feed.release()
+
+    if since > revision or since < revision - MATRIX_CHANGE_HISTORY:
+        return jsonify(revision=revision, changes={}, reset=True)
+    changes = {}
+    for cell, value in query_db(MATRIX_CHANGES_SQL, (id, year, since, revision)):
+        changes[cell] = cell_text(value)
+    return jsonify(revision=revision, changes=changes, reset=False)
 
 # Alias matrix endpoint so you can pass code instead of numeric id:
-@app.route("/etablissement/<code>/<int:year>/matrix", methods=["GET", "POST"])
+@app.route("/etablissement/<code>/<int:year>/matrix", methods=["GET", "POST", "PATCH"])
 @login_required
 def matrix_by_code(code, year):
-    # look up numeric ID from the code
-    row = query_db(
-        "SELECT establishment_id FROM establishments WHERE code = ?",
-        (code,),
-        one=True
-    )
-    if not row:
+    etab_id = establishments.id_for(code)
+    if etab_id is None:
         return jsonify(success=False, error="Établissement introuvable"), 404
 
     # delegate back to your id‐based matrix handler
-    return matrix(row[0], year)
+    if request.method == "PATCH":
+        return patch_matrix(etab_id, year)
+    return matrix(etab_id, year)
+
+@app.route("/etablissement/<code>/<int:year>/matrix/changes", methods=["GET"])
+@login_required
+def matrix_changes_by_code(code, year):
+    etab_id = establishments.id_for(code)
+    if etab_id is None:
+        return jsonify(success=False, error="Établissement introuvable"), 404
+    return matrix_changes(etab_id, year)
+
+# --- bulk matrix endpoints --------------------------------------------------
+
+MATRIX_BULK_SELECT_SQL = f"""
+    SELECT m.establishment_id, e.code, m.year, {", ".join(f"m.{c}" for c in MATRIX_CELLS)}
+    FROM matrix_data m
+    LEFT JOIN establishments e ON e.establishment_id = m.establishment_id
+    WHERE m.year BETWEEN ? AND ?
+      AND (? IS NULL OR m.establishment_id IN (SELECT value FROM json_each(?)))
+    ORDER BY m.establishment_id, m.year
+"""
+
+def matrix_from_row(row, offset=0):
+    """{row: [6 values]} from MATRIX_CELLS values starting at row[offset]."""
+    return {
+        r: [row[offset + i * len(COLS) + j] or "" for j in range(len(COLS))]
+        for i, r in enumerate(ROWS)
+    }
+
+def parse_establishment_ids(raw):
+    """Ids from a comma separated list of ids and/or codes, or None if unknown."""
+    ids = []
+    for token in raw.split(","):
+        token = token.strip()
+        if not token:
+            continue
+        etab_id = int(token) if token.isdigit() else establishments.id_for(token)
+        if etab_id is None:
+            return None
+        ids.append(etab_id)
+    return ids
+
+@app.route("/api/matrices", methods=["GET"])
+@login_required
+def bulk_matrices():
+    """Stream every stored matrix matching ?establishments=&from=&to= as JSON.
+
+    Establishment users only ever see their own establishment.
+    """
+    usr = session["user"]
+    year_from = request.args.get("from", 0, type=int)
+    year_to = request.args.get("to", 9999, type=int)
+
+    ids = None
+    if request.args.get("establishments"):
+        ids = parse_establishment_ids(request.args["establishments"])
+        if ids is None:
+            return jsonify(success=False, error="Établissement introuvable"), 404
+    if usr["role"] == "establishment":
+        if ids is None:
+            ids = [usr["establishmentId"]]
+        elif any(i != usr["establishmentId"] for i in ids):
+            return jsonify(success=False, error="Access denied to this establishment's matrix"), 403
+
+    ids_json = json.dumps(ids) if ids is not None else None
+    cur = get_db().execute(MATRIX_BULK_SELECT_SQL, (year_from, year_to, ids_json, ids_json))
+
+    def generate():
+        yield '{"columns": %s, "rows": %s, "matrices": [' % (json.dumps(COLS), json.dumps(ROWS))
+        first = True
+        while True:
+            batch = cur.fetchmany(BULK_FETCH_SIZE)
+            if not batch:
+                break
+            chunk = ",".join(
+                json.dumps({"id": r[0], "code": r[1], "year": r[2], "matrix": matrix_from_row(r, 3)})
+                for r in batch
+            )
+            yield chunk if first else "," + chunk
+            first = False
+        yield "]}"
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
+
+@app.route("/api/matrices", methods=["POST"])
+@login_required
+def bulk_save_matrices():
+    """Upsert many matrices in one transaction.
+
+    Body: {"matrices": [{"id" or "code": ..., "year": ..., "matrix": {row: [6 values]}}]}
+    """
+    usr = session["user"]
+    payload = request.get_json(silent=True) or {}
+    items = payload.get("matrices") if isinstance(payload, dict) else None
+    if not isinstance(items, list):
+        return jsonify(success=False, error="Invalid matrix payload"), 400
+
+    params = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            return jsonify(success=False, error="Invalid matrix payload", index=index), 400
+        etab_id = item.get("id")
+        if etab_id is None and "code" in item:
+            etab_id = establishments.id_for(item["code"])
+            if etab_id is None:
+                return jsonify(success=False, error="Établissement introuvable", index=index), 404
+        year = item.get("year")
+        values = matrix_values(item.get("matrix") or {})
+        if (not isinstance(etab_id, int) or not isinstance(year, int)
+                or isinstance(etab_id, bool) or isinstance(year, bool) or values is None):
+            return jsonify(success=False, error="Invalid matrix payload", index=index), 400
+        if establishments.by_id(etab_id) is None:
+            return jsonify(success=False, error="Établissement introuvable", index=index), 404
+        if usr["role"] == "establishment" and usr["establishmentId"] != etab_id:
+            return jsonify(success=False, error="Access denied to this establishment's matrix", index=index), 403
+        params.append([etab_id, year, *values])
+
+    con = get_db()
+    with con:
+        save_matrices(con, params)
+    matrix_feed.notify()
+    return jsonify(success=True, count=len(params))
+
+# --- establishment export ---------------------------------------------------
+
+class ZipSink:
+    """Write-only file object collecting zipfile output for a generator.
+
+    zipfile treats it as unseekable (no tell/seek) and writes data
+    descriptors, so entries can be streamed without knowing sizes upfront.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def matrices_export(etab_id, year_from, year_to, fmt):
+    rows = query_db(f"""
+        SELECT year, {", ".join(MATRIX_CELLS)} FROM matrix_data
+        WHERE establishment_id = ? AND year BETWEEN ? AND ?
+        ORDER BY year
+    """, (etab_id, year_from, year_to))
+    if fmt == "json":
+        data = [{"year": r[0], "matrix": matrix_from_row(r, 1)} for r in rows]
+        return "matrices.json", json.dumps(
+            {"id": etab_id, "columns": COLS, "rows": ROWS, "matrices": data},
+            ensure_ascii=False, indent=2,
+        ).encode()
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["year", *MATRIX_CELLS])
+    for r in rows:
+        writer.writerow([r[0], *(v if v is not None else "" for v in r[1:])])
+    return "matrices.csv", out.getvalue().encode()
+
+@app.route("/api/export/<int:id>", methods=["GET"])
+@login_required
+def export_establishment(id):
+    """Stream a ZIP of the establishment's PDFs plus its matrices.
+
+    ?from=&to= limit the years, ?format=csv|json picks the matrix file.
+    PDFs are stored uncompressed; nothing is buffered beyond one chunk.
+    """
+    usr = session["user"]
+    if usr["role"] == "establishment" and usr["establishmentId"] != id:
+        return jsonify(success=False, error="Access denied to this establishment's matrix"), 403
+    known = establishments.by_id(id)
+    if known is None:
+        return jsonify(success=False, error="Établissement introuvable"), 404
+
+    year_from = request.args.get("from", 0, type=int)
+    year_to = request.args.get("to", 9999, type=int)
+    fmt = request.args.get("format", "csv")
+    if fmt not in ("csv", "json"):
+        return jsonify(success=False, error="format must be csv or json"), 400
+
+    matrices_name, matrices_data = matrices_export(id, year_from, year_to, fmt)
+    files = query_db("""
+        SELECT stored_filepath, year, report, version, filename FROM report_files
+        WHERE establishment_id = ? AND year BETWEEN ? AND ?
+        ORDER BY year, report, version, filename
+    """, (id, year_from, year_to))
+
+    def generate():
+        sink = ZipSink()
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as zf:
+            zf.writestr(matrices_name, matrices_data, compress_type=zipfile.ZIP_DEFLATED)
+            yield sink.drain()
+            for rel, year, report, version, filename in files:
+                path = os.path.join(FILES_ROOT, rel)
+                if not os.path.isfile(path):
+                    continue  # catalog drift; reconcile-files will drop it
+                info = zipfile.ZipInfo.from_file(path, f"{year}/{report}/{version}/{filename}")
+                with open(path, "rb") as src, zf.open(info, "w") as dst:
+                    while chunk := src.read(CHUNK_SIZE):
+                        dst.write(chunk)
+                        yield sink.drain()
+                yield sink.drain()
+        yield sink.drain()
+
+    name = f"{known[2]}_{year_from}-{year_to}.zip" if request.args.get("from") else f"{known[2]}.zip"
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={name}"},
+    )
+
+@app.route("/api/export/<code>", methods=["GET"])
+@login_required
+def export_establishment_by_code(code):
+    etab_id = establishments.id_for(code)
+    if etab_id is None:
+        return jsonify(success=False, error="Établissement introuvable"), 404
+    return export_establishment(etab_id)
 
 # --- reports/details --------------------------------------------------------
 
+DETAILS_FIELDS = ["constat", "recommendation", "plan", "intervenant", "delai", "etat"]
+DETAILS_CACHE_FILES = 64
+
+def details_path(etab_id):
+    return f"{FILES_ROOT}/etab_{etab_id}/details_{etab_id}.txt"
+
+def parse_details(path):
+    """Records of six lines each; an incomplete trailing record is dropped."""
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    n = len(DETAILS_FIELDS)
+    return [
+        dict(zip(DETAILS_FIELDS, lines[i:i + n]))
+        for i in range(0, len(lines) - n + 1, n)
+    ]
+
+class DetailsCache:
+    """Parsed details files keyed by (path, mtime, size), least recently used out."""
+
+    def __init__(self, max_files=DETAILS_CACHE_FILES):
+        self._max_files = max_files
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        st = os.stat(path)
+        key = (path, st.st_mtime, st.st_size)
+        with self._lock:
+            table = self._entries.get(key)
+            if table is not None:
+                self._entries.move_to_end(key)
+                return table
+        table = parse_details(path)
+        with self._lock:
+            self._entries[key] = table
+            while len(self._entries) > self._max_files:
+                self._entries.popitem(last=False)
+        return table
+
+details_cache = DetailsCache()
+
+def import_details(con, etab_id, path):
+    """Replace the establishment's audit_findings with the records in ``path``."""
+    table = parse_details(path)
+    con.execute("DELETE FROM audit_findings WHERE establishment_id = ?", (etab_id,))
+    con.executemany(
+        f"INSERT INTO audit_findings (establishment_id, position, {', '.join(DETAILS_FIELDS)}) "
+        f"VALUES (?, ?, {', '.join('?' for _ in DETAILS_FIELDS)})",
+        [(etab_id, pos, *(rec[f] for f in DETAILS_FIELDS)) for pos, rec in enumerate(table)],
+    )
+    return len(table)
+
+@app.cli.command("import-details")
+def import_details_command():
+    """Load every etab_N/details_N.txt into the audit_findings table."""
+    pattern = re.compile(r"^details_(\d+)\.txt$")
+    with pooled_connection() as con:
+        for entry in sorted(os.listdir(FILES_ROOT)):
+            folder = os.path.join(FILES_ROOT, entry)
+            if not os.path.isdir(folder):
+                continue
+            for fn in os.listdir(folder):
+                m = pattern.match(fn)
+                if m and entry == f"etab_{m.group(1)}":
+                    with con:
+                        count = import_details(con, int(m.group(1)), os.path.join(folder, fn))
+                    click.echo(f"{entry}: {count} findings")
+
 @app.route("/reports", methods=["GET"])
 @login_required
 def reports():
+    """Audit findings of the user's establishment.
+
+    Optional ?etat= and ?intervenant= filters. Pages with ?limit= and the
+    returned nextCursor (?cursor=), or with ?offset=. Served from
+    audit_findings once imported, else from the details file.
+    """
     usr = session["user"]
     if usr["role"] != "establishment":
         return jsonify(success=False, error="No report for admin"), 403
 
     etab_id = usr["establishmentId"]
-    path = f"etablissements/etab_{etab_id}/details_{etab_id}.txt"
-    if not os.path.exists(path):
-        return jsonify(success=False, error="Details file not found"), 404
-
-    lines = open(path).read().splitlines()
-    table = [
-        {"constat": lines[i],
-         "recommendation": lines[i+1],
-         "plan": lines[i+2],
-         "intervenant": lines[i+3],
-         "delai": lines[i+4],
-         "etat": lines[i+5]}
-        for i in range(0, len(lines), 6)
-    ]
-    return jsonify(id=etab_id, table=table)
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    limit = request.args.get("limit", type=int)
+    if limit is not None:
+        limit = min(max(limit, 1), MAX_PAGE_SIZE)
+    filters = {f: request.args[f] for f in ("etat", "intervenant") if f in request.args}
+    after = None
+    if "cursor" in request.args:
+        cursor = decode_cursor(request.args["cursor"])
+        if cursor is None or not isinstance(cursor[0], int):
+            return jsonify(success=False, error="Curseur invalide"), 400
+        after, offset = cursor[0], 0
+    # one extra row tells whether there is a next page
+    fetch = limit + 1 if limit is not None else None
+
+    imported = query_db(
+        "SELECT 1 FROM audit_findings WHERE establishment_id = ? LIMIT 1", (etab_id,), one=True
+    )
+    if imported:
+        args = [etab_id, *filters.values()]
+        where = " AND ".join(["establishment_id = ?", *(f"{f} = ?" for f in filters)])
+        total = query_db(f"SELECT count(*) FROM audit_findings WHERE {where}", args, one=True)[0]
+        rows = query_db(
+            findings_page_sql(list(filters), after is not None),
+            [*args, *([after] if after is not None else []), fetch if fetch is not None else -1, offset],
+        )
+        page = [(r[0], dict(zip(DETAILS_FIELDS, r[1:]))) for r in rows]
+    else:
+        path = details_path(etab_id)
+        if not os.path.exists(path):
+            return jsonify(success=False, error="Details file not found"), 404
+        page = [
+            (pos, r) for pos, r in enumerate(details_cache.get(path))
+            if all(r[f] == v for f, v in filters.items())
+        ]
+        total = len(page)
+        if after is not None:
+            page = [(pos, r) for pos, r in page if pos > after]
+        page = page[offset:offset + fetch] if fetch is not None else page[offset:]
+
+    next_cursor = None
+    if limit is not None and len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(page[-1][0])
+    return jsonify(id=etab_id, table=[r for _, r in page], total=total,
+                   offset=offset, limit=limit, nextCursor=next_cursor)
+
+def findings_page_sql(filters, keyset):
+    """Findings in position order; (establishment_id, <filter>, position) indexes serve it."""
+    where = " AND ".join([
+        "establishment_id = ?",
+        *(f"{f} = ?" for f in filters),
+        *(["position > ?"] if keyset else []),
+    ])
+    return (f"SELECT position, {', '.join(DETAILS_FIELDS)} FROM audit_findings "
+            f"WHERE {where} ORDER BY position LIMIT ? OFFSET ?")
+
+REPORT_METADATA_SQL = """
+    SELECT rt.type_code, rt.description, r.version
+    FROM reports r
+    JOIN report_types rt ON r.report_type_id = rt.report_type_id
+    WHERE r.establishment_id = ? AND r.year = ?
+    ORDER BY rt.type_code, r.version
+"""
+REPORT_METADATA_RANGE_SQL = """
+    SELECT r.year, rt.type_code, rt.description, r.version
+    FROM reports r
+    JOIN report_types rt ON r.report_type_id = rt.report_type_id
+    WHERE r.establishment_id = ? AND r.year BETWEEN ? AND ?
+    ORDER BY r.year, rt.type_code, r.version
+"""
 
 @app.route("/api/report-metadata/<int:id>/<int:year>", methods=["GET"])
 @login_required
+@cached_response(lambda id, year: ("reports", id))
 def api_report_metadata(id, year):
     # --- Permission Check --- 
     # Allow admin access to any metadata
@@ -376,70 +2535,446 @@ def api_report_metadata(id, year):
     # --- End Permission Check ---
 
     # Fetch all report types that have at least one report for this establishment & year
-    rows = query_db("""
-        SELECT rt.type_code, rt.description, r.version
-        FROM reports r
-        JOIN report_types rt ON r.report_type_id = rt.report_type_id
-        WHERE r.establishment_id = ? AND r.year = ?
-        ORDER BY rt.type_code, r.version
-    """, (id, year))
-
-    # Group versions by type_code
-    metadata: dict[str, dict[str, list[str]]] = {}
+    rows = query_db(REPORT_METADATA_SQL, (id, year))
+
+    return jsonify(reports=group_report_metadata(rows))
+
+def group_report_metadata(rows):
+    """Group (type_code, description, version) rows into one entry per type."""
+    metadata: dict[str, dict] = {}
     for type_code, description, version in rows:
-        if type_code not in metadata:
-            metadata[type_code] = {
-                "description": description,
-                "versions": []
-            }
-        if version not in metadata[type_code]["versions"]:
-            metadata[type_code]["versions"].append(version)
+        md = metadata.get(type_code)
+        if md is None:
+            md = metadata[type_code] = {"description": description, "versions": {}}
+        md["versions"][version] = None  # dict as an ordered set
 
-    # Build the final list
-    result = [
+    return [
         {
             "key": type_code,
             "name": type_code,
             "description": md["description"],
-            "versions": md["versions"]
+            "versions": list(md["versions"])
         }
         for type_code, md in metadata.items()
     ]
 
-    return jsonify(reports=result)
-
 # New code‐based version
 @app.route("/api/report-metadata/<code>/<int:year>", methods=["GET"])
 @login_required
 def api_report_metadata_by_code(code, year):
-    # look up numeric ID from code
-    row = query_db(
-        "SELECT establishment_id FROM establishments WHERE code = ?",
-        (code,),
-        one=True
-    )
-    if not row:
+    etab_id = establishments.id_for(code)
+    if etab_id is None:
         return jsonify(success=False, error="Établissement introuvable"), 404
 
     # delegate to the existing function
     # (Flask will treat the returned Response normally)
-    return api_report_metadata(row[0], year)
+    return api_report_metadata(etab_id, year)
 
 
+@app.route("/api/report-metadata/<int:id>", methods=["GET"])
+@login_required
+@cached_response(lambda id: ("reports", id))
+def api_report_metadata_range(id):
+    """Report metadata for every year in ?from=&to=, from a single query."""
+    usr = session["user"]
+    if usr["role"] == "establishment" and usr["establishmentId"] != id:
+        return jsonify(success=False, error="Access denied to this establishment's reports"), 403
+
+    year_from = request.args.get("from", 0, type=int)
+    year_to = request.args.get("to", 9999, type=int)
+    rows = query_db(REPORT_METADATA_RANGE_SQL, (id, year_from, year_to))
+
+    by_year: dict[int, list] = {}
+    for year, *rest in rows:
+        by_year.setdefault(year, []).append(rest)
+    return jsonify(years={
+        str(year): group_report_metadata(year_rows) for year, year_rows in by_year.items()
+    })
+
+@app.route("/api/report-metadata/<code>", methods=["GET"])
+@login_required
+def api_report_metadata_range_by_code(code):
+    etab_id = establishments.id_for(code)
+    if etab_id is None:
+        return jsonify(success=False, error="Établissement introuvable"), 404
+    return api_report_metadata_range(etab_id)
+
+@app.route("/api/report-types", methods=["GET"])
+@login_required
+def api_report_types():
+    return jsonify(report_types=report_types.listing())
+
+# --- search -----------------------------------------------------------------
+
+SEARCH_KINDS = ("establishment", "report_type", "finding", "document")
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_WORD_RE = re.compile(r"\w+")
+# snippet() brackets matches with these; they become <mark> after escaping
+SEARCH_MARKS = ("\x02", "\x03")
+
+# Columns the user's words are matched against in the establishment-scoped indexes
+FINDING_TEXT_COLUMNS = "{constat recommendation plan intervenant}"
+DOCUMENT_TEXT_COLUMNS = "{text}"
+
+# kind -> (FTS table, key column, label column, MATCH parameter)
+SEARCH_SOURCES = {
+    "establishment": ("establishments_fts", "code", "name", ":q"),
+    "report_type": ("report_types_fts", "type_code", "description", ":q"),
+    "finding": ("audit_findings_fts", "NULL", "NULL", ":finding_q"),
+    "document": ("report_files_fts", "NULL", "NULL", ":document_q"),
+}
+
+def search_sql(kinds, keyset):
+    """Hits of the given kinds by bm25 rank (lower is better), then kind and rowid.
+
+    Each kind is ranked and cut to :limit on its own, so snippet() only runs
+    for rows that can make the page. ``keyset`` resumes after (:score,
+    :kind, :ref).
+    """
+    branches = []
+    for kind in kinds:
+        table, key, label, match = SEARCH_SOURCES[kind]
+        after = f" AND (rank, '{kind}', rowid) > (:score, :kind, :ref)" if keyset else ""
+        branches.append(
+            f"SELECT * FROM (SELECT '{kind}' AS kind, rowid AS ref, rank AS score, "
+            f"{key} AS key, {label} AS label, "
+            f"snippet({table}, -1, char(2), char(3), '…', 12) AS snippet "
+            f"FROM {table} WHERE {table} MATCH {match}{after} ORDER BY rank, rowid LIMIT :limit)"
+        )
+    return (f"SELECT * FROM ({' UNION ALL '.join(branches)}) "
+            f"ORDER BY score, kind, ref LIMIT :limit")
+
+def match_query(text):
+    """FTS5 query for free text: every word must match, the last one as a prefix."""
+    words = SEARCH_WORD_RE.findall(text)
+    if not words:
+        return None
+    return " ".join(f'"{w}"' for w in words) + "*"
+
+def scoped_match_query(columns, q, etab):
+    """``q`` against ``columns``, within one establishment unless ``etab`` is None."""
+    scoped = f'establishment_id : "{etab}" AND ' if etab is not None else ""
+    return f"{scoped}{columns} : ({q})"
+
+def snippet_html(text):
+    open_mark, close_mark = SEARCH_MARKS
+    return (html.escape(text or "")
+            .replace(open_mark, "<mark>").replace(close_mark, "</mark>"))
+
+def search_results(rows):
+    """API entries for the rows of search_sql()."""
+    finding_ids = [r["ref"] for r in rows if r["kind"] == "finding"]
+    findings = {}
+    if finding_ids:
+        findings = {
+            f["finding_id"]: f for f in query_db(
+                "SELECT f.finding_id, f.establishment_id, e.code, f.position, f.etat "
+                "FROM audit_findings f JOIN establishments e ON e.establishment_id = f.establishment_id "
+                f"WHERE f.finding_id IN ({', '.join('?' for _ in finding_ids)})",
+                finding_ids,
+            )
+        }
+    file_ids = [r["ref"] for r in rows if r["kind"] == "document"]
+    files = {}
+    if file_ids:
+        files = {
+            f["file_id"]: f for f in query_db(
+                "SELECT f.file_id, f.establishment_id, e.code, f.year, f.report, f.version, "
+                "f.filename, f.stored_filepath, f.sha256, d.pages "
+                "FROM report_files f JOIN establishments e ON e.establishment_id = f.establishment_id "
+                "JOIN pdf_documents d ON d.sha256 = f.sha256 "
+                f"WHERE f.file_id IN ({', '.join('?' for _ in file_ids)})",
+                file_ids,
+            )
+        }
+    results = []
+    for r in rows:
+        entry = {"type": r["kind"], "snippet": snippet_html(r["snippet"])}
+        if r["kind"] == "establishment":
+            entry.update(id=r["ref"], key=r["key"], label=r["label"])
+        elif r["kind"] == "report_type":
+            entry.update(key=r["key"], description=r["label"])
+        elif r["kind"] == "finding":
+            finding = findings.get(r["ref"])
+            if not finding:
+                continue
+            entry.update(establishmentId=finding["establishment_id"], key=finding["code"],
+                         position=finding["position"], etat=finding["etat"])
+        else:
+            file = files.get(r["ref"])
+            if not file:
+                continue
+            entry.update(establishmentId=file["establishment_id"], key=file["code"],
+                         year=file["year"], report=file["report"], version=file["version"],
+                         filename=file["filename"], path=file["stored_filepath"],
+                         sha256=file["sha256"], pages=file["pages"])
+        results.append(entry)
+    return results
+
+@app.route("/api/search", methods=["GET"])
+@login_required
+def api_search():
+    """Ranked full-text search: ?q=&type=&establishment=&limit=&cursor=.
+
+    Establishments and report types are visible to everyone, like their
+    listings. Establishment users only get their own audit findings and
+    report file text; admins get everyone's, or one establishment's with
+    ?establishment=<id>.
+    """
+    usr = session["user"]
+    q = match_query(request.args.get("q", ""))
+    if q is None:
+        return jsonify(success=False, error="Requête de recherche vide"), 400
+
+    kinds = SEARCH_KINDS
+    if "type" in request.args:
+        kinds = [k for k in SEARCH_KINDS if k in request.args["type"].split(",")]
+        if not kinds:
+            return jsonify(success=False, error="Type de résultat inconnu"), 400
+
+    etab = request.args.get("establishment", type=int)
+    if usr["role"] == "establishment":
+        if etab is not None and etab != usr["establishmentId"]:
+            return jsonify(success=False, error="Accès refusé"), 403
+        etab = usr["establishmentId"]
+
+    limit = min(max(request.args.get("limit", SEARCH_DEFAULT_LIMIT, type=int), 1), MAX_PAGE_SIZE)
+    params = {
+        "q": q,
+        "finding_q": scoped_match_query(FINDING_TEXT_COLUMNS, q, etab),
+        "document_q": scoped_match_query(DOCUMENT_TEXT_COLUMNS, q, etab),
+        "limit": limit + 1,
+    }
+    after = None
+    if "cursor" in request.args:
+        after = decode_cursor(request.args["cursor"])
+        if (after is None or len(after) != 3 or not isinstance(after[0], (int, float))
+                or after[1] not in SEARCH_KINDS or not isinstance(after[2], int)):
+            return jsonify(success=False, error="Curseur invalide"), 400
+        params.update(score=after[0], kind=after[1], ref=after[2])
+
+    rows = query_db(search_sql(kinds, after is not None), params)
+    page = rows[:limit]
+    last = page[-1] if len(rows) > limit else None
+    return jsonify(
+        results=search_results(page),
+        nextCursor=encode_cursor(last["score"], last["kind"], last["ref"]) if last else None,
+    )
+
+@app.cli.command("optimize-search")
+def optimize_search_command():
+    """Merge the search indexes' segments (worth running after bulk imports)."""
+    with pooled_connection() as con:
+        with con:
+            for table in ("establishments_fts", "report_types_fts", "audit_findings_fts",
+                          "report_files_fts"):
+                con.execute(f"INSERT INTO {table} ({table}) VALUES ('optimize')")
+                click.echo(f"{table}: optimized")
+
+# --- query plans ------------------------------------------------------------
+
+def query_plan_checks():
+    """(name, sql, params, text the plan must contain) for the hot queries."""
+    return [
+        ("establishment directory", ESTABLISHMENTS_SQL, (),
+         "SCAN establishments USING COVERING INDEX idx_establishments_name_code"),
+        ("establishments page", establishments_page_sql(True), ("", 50),
+         "SEARCH establishments USING COVERING INDEX idx_establishments_name_code (name>?)"),
+        ("establishment by code", "SELECT establishment_id FROM establishments WHERE code = ?", ("",),
+         "SEARCH establishments USING COVERING INDEX"),
+        ("report metadata", REPORT_METADATA_SQL, (1, 2024),
+         "SEARCH r USING COVERING INDEX"),
+        ("report metadata range", REPORT_METADATA_RANGE_SQL, (1, 2020, 2025),
+         "SEARCH r USING COVERING INDEX"),
+        ("report file listing", REPORT_FILES_LIST_SQL, (1, 2024, "", ""),
+         "SEARCH report_files USING COVERING INDEX idx_report_files_listing"),
+        ("matrix", "SELECT * FROM matrix_data WHERE establishment_id=? AND year=?", (1, 2024),
+         "SEARCH matrix_data USING INDEX"),
+        ("matrix change feed", MATRIX_CHANGES_SQL, (1, 2024, 0, 10),
+         "USING INDEX idx_matrix_changes_matrix_revision (establishment_id=? AND year=? AND revision>? AND revision<?)"),
+        ("full-text search", search_sql(SEARCH_KINDS, True),
+         {"q": '"x"', "finding_q": scoped_match_query(FINDING_TEXT_COLUMNS, '"x"', 1),
+          "document_q": scoped_match_query(DOCUMENT_TEXT_COLUMNS, '"x"', 1),
+          "score": 0, "kind": "", "ref": 0, "limit": 50},
+         "SCAN audit_findings_fts VIRTUAL TABLE INDEX 0:M"),
+        ("establishment stats page", ESTABLISHMENT_STATS_PAGE_SQL, (0, 50),
+         "SEARCH matrix_establishment_stats USING INTEGER PRIMARY KEY (rowid>?)"),
+        ("job claim", JOB_CLAIM_SQL, ("", 0, 0, 0, 5),
+         "SEARCH jobs USING INDEX idx_jobs_due (status=? AND run_after<?)"),
+        ("findings page", findings_page_sql([], True), (1, 0, 50, 0),
+         "(establishment_id=? AND position>?)"),
+        ("findings by etat", findings_page_sql(["etat"], True), (1, "", 0, 50, 0),
+         "USING INDEX idx_audit_findings_etat (establishment_id=? AND etat=? AND position>?)"),
+        ("findings by intervenant", findings_page_sql(["intervenant"], True), (1, "", 0, 50, 0),
+         "USING INDEX idx_audit_findings_intervenant (establishment_id=? AND intervenant=? AND position>?)"),
+    ]
+
+@app.cli.command("check-plans")
+def check_plans_command():
+    """Fail unless every hot query still uses the index it was written for."""
+    failed = 0
+    with pooled_connection() as con:
+        for name, sql, params, expected in query_plan_checks():
+            plan = [r[3] for r in con.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+            ok = any(expected in line for line in plan)
+            failed += not ok
+            click.echo(f"{'ok  ' if ok else 'FAIL'} {name}: {' | '.join(plan)}")
+    if failed:
+        raise SystemExit(1)
+
+@app.route("/api/cache-stats", methods=["GET"])
+@login_required
+def api_cache_stats():
+    return jsonify(responses=response_cache.stats())
+
+def prom_labels(**labels):
+    def escape(v):
+        return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels.items()) + "}"
+
+def prom_histogram(lines, name, histograms):
+    """``histograms`` maps label dicts (as tuples of items) to new_histogram() lists."""
+    for labels, hist in sorted(histograms.items()):
+        labels = dict(labels)
+        cumulative = 0
+        for bound, n in zip(LATENCY_BUCKETS, hist):
+            cumulative += n
+            lines.append(f"{name}_bucket{prom_labels(**labels, le=bound)} {cumulative}")
+        cumulative += hist[len(LATENCY_BUCKETS)]
+        lines.append(f"{name}_bucket{prom_labels(**labels, le='+Inf')} {cumulative}")
+        lines.append(f"{name}_sum{prom_labels(**labels)} {hist[-1]:.6f}")
+        lines.append(f"{name}_count{prom_labels(**labels)} {cumulative}")
+
+def render_metrics(snapshots):
+    """Add up worker snapshots and format them for Prometheus."""
+    requests, latency, sql, fs, cache = {}, {}, {}, {}, {}
+    idle = 0
+
+    def add_histogram(target, key, hist):
+        current = target.setdefault(key, new_histogram())
+        for i, v in enumerate(hist):
+            current[i] += v
+
+    for snap in snapshots:
+        for method, route, status, n in snap["requests"]:
+            key = (("method", method), ("route", route), ("status", status))
+            requests[key] = requests.get(key, 0) + n
+        for method, route, hist in snap["latency"]:
+            add_histogram(latency, (("method", method), ("route", route)), hist)
+        for route, statements, seconds in snap["sql"]:
+            totals = sql.setdefault(route, [0, 0.0])
+            totals[0] += statements
+            totals[1] += seconds
+        for op, hist in snap["fs"]:
+            add_histogram(fs, (("op", op),), hist)
+        for k, v in snap["cache"].items():
+            cache[k] = cache.get(k, 0) + v
+        idle += snap["idleConnections"]
+
+    lines = [
+        "# HELP http_requests_total Requests handled, by route and status.",
+        "# TYPE http_requests_total counter",
+    ]
+    for labels, n in sorted(requests.items()):
+        lines.append(f"http_requests_total{prom_labels(**dict(labels))} {n}")
+    lines += [
+        "# HELP http_request_duration_seconds Time spent producing the response (streamed bodies excluded).",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    prom_histogram(lines, "http_request_duration_seconds", latency)
+    lines += [
+        "# HELP sql_statements_total SQL statements executed, by route.",
+        "# TYPE sql_statements_total counter",
+    ]
+    for route, (statements, _) in sorted(sql.items()):
+        lines.append(f"sql_statements_total{prom_labels(route=route)} {statements}")
+    lines += [
+        "# HELP sql_seconds_total Time spent executing SQL and fetching rows, by route.",
+        "# TYPE sql_seconds_total counter",
+    ]
+    for route, (_, seconds) in sorted(sql.items()):
+        lines.append(f"sql_seconds_total{prom_labels(route=route)} {seconds:.6f}")
+    lines += [
+        "# HELP fs_operation_seconds Filesystem work for uploads and downloads, by operation.",
+        "# TYPE fs_operation_seconds histogram",
+    ]
+    prom_histogram(lines, "fs_operation_seconds", fs)
+    for key, name, kind in (
+        ("hits", "response_cache_hits_total", "counter"),
+        ("misses", "response_cache_misses_total", "counter"),
+        ("notModified", "response_cache_not_modified_total", "counter"),
+        ("entries", "response_cache_entries", "gauge"),
+    ):
+        lines += [f"# TYPE {name} {kind}", f"{name} {cache.get(key, 0)}"]
+    lines += ["# TYPE db_pool_idle_connections gauge", f"db_pool_idle_connections {idle}"]
+    return "\n".join(lines) + "\n"
+
+# Unauthenticated like /health so Prometheus can scrape it: route names and
+# counts only. Restrict it at the proxy if that matters.
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    # the job queue is shared by every worker, so it is read from the table
+    counts = dict(query_db(
+        "SELECT status, count(*) FROM jobs WHERE status IN ('queued', 'running', 'failed') GROUP BY status"
+    ))
+    jobs = ["# HELP background_jobs Jobs waiting, running or failed.", "# TYPE background_jobs gauge"]
+    jobs += [f"background_jobs{prom_labels(status=s)} {counts.get(s, 0)}"
+             for s in ("queued", "running", "failed")]
+    return Response(render_metrics(metrics.collect()) + "\n".join(jobs) + "\n",
+                    mimetype="text/plain; version=0.0.4")
+
 # --- fallback / healthcheck ------------------------------------------------
 
 @app.route("/health", methods=["GET"])
 def health():
     return jsonify(status="ok")
 
+# Set by warm_up(); /health/ready answers 503 until then.
+worker_state = {"ready": False, "started_at": time.time(), "warmed_in_ms": None}
+
+def warm_up(connections=POOL_SIZE):
+    """Open pooled connections and load the in-process caches."""
+    start = time.perf_counter()
+    get_pool().fill(connections)
+    establishments.listing()
+    report_types.listing()
+    metrics.start_flushing()
+    job_runner.start()
+    with pooled_connection() as con:
+        expire_uploads(con)
+    worker_state["warmed_in_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    worker_state["ready"] = True
+
+def shutdown():
+    """Release SQLite handles; called when a worker exits."""
+    worker_state["ready"] = False
+    job_runner.stop()
+    if _pool is not None:
+        _pool.close()
+    # last snapshot keeps this worker's counters, with its gauges at zero
+    response_cache.clear()
+    metrics.flush()
+
+@app.route("/health/ready", methods=["GET"])
+def health_ready():
+    body = {
+        "status": "ready" if worker_state["ready"] else "starting",
+        "pid": os.getpid(),
+        "uptime": round(time.time() - worker_state["started_at"], 1),
+        "warmedInMs": worker_state["warmed_in_ms"],
+        "idleConnections": _pool.idle_count() if _pool is not None else 0,
+    }
+    return jsonify(body), 200 if worker_state["ready"] else 503
+
 if __name__ == "__main__":
-    # Ensure the backend directory exists relative to the script
-    backend_dir = os.path.dirname(os.path.abspath(__file__))
-    DATABASE = os.path.join(backend_dir, "datab.db")
-    # Make sure the database file path is correct
+    # Development server only; see gunicorn.conf.py for production.
     print(f"Using database at: {DATABASE}")
     if not os.path.exists(DATABASE):
         print("Warning: Database file not found!")
 
+    # with debug=True this file runs twice: a reloader that only watches for
+    # changes, and the child (WERKZEUG_RUN_MAIN) that serves requests
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        warm_up()
     app.run(host="0.0.0.0", port=5000, debug=True)
 
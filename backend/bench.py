@@ -0,0 +1,416 @@
+"""Load-testing and latency benchmark for the backend.
+
+Two steps, so results can be compared between commits on the same data:
+
+    # synthetic data set shaped like seed.sql, plus the matching file tree
+    python bench.py build --out /tmp/bench --establishments 10000 --years 10
+
+    # concurrent clients log in and replay a mix of API calls; prints JSON
+    python bench.py run --data /tmp/bench --clients 16 --duration 30
+
+``run`` starts the app in-process on the given data unless ``--url`` points
+at a server that is already running (e.g. gunicorn started with
+DATABASE/FILES_ROOT set to the same data). Without ``--data`` it uses the
+seeded backend/datab.db.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from urllib.parse import quote, urlsplit
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+ADMIN = {"email": "admin@agro.com", "password": "test123"}
+DEFAULT_REPORT_TYPES = [
+    ("PV", "Procès-verbal de réunion"),
+    ("CE", "Compte-rendu d’Évaluation"),
+    ("RAPPORT_ANNUEL", "Rapport annuel"),
+]
+ROWS = ["AE", "CE", "IGF", "CC"]
+COLS = ["IC", "OB", "REC", "CA", "DD", "DA"]
+CELLS = [f"{r}_{c}" for r in ROWS for c in COLS]
+FINDING_WORDS = (
+    "absence contrôle interne procédure stock inventaire trésorerie rapprochement "
+    "bancaire marché public avenant délai paiement fournisseur régie recette dépense "
+    "engagement comptable patrimoine immobilisation amortissement subvention convention "
+    "archivage pièce justificative signature délégation conformité budget exécution"
+).split()
+INTERVENANTS = ["Direction", "Agent comptable", "Contrôleur financier", "Service achats", "DRH"]
+# Written into every directory made by ``build``: only those are replaced.
+BUILD_MARKER = ".bench-build"
+
+# --- build -----------------------------------------------------------------
+
+
+def make_pdf(size):
+    """A minimal valid one-page PDF, padded with a comment to ``size`` bytes."""
+    body = (
+        b"%PDF-1.4\n"
+        b"1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n"
+        b"2 0 obj << /Type /Pages /Kids [3 0 R] /Count 1 >> endobj\n"
+        b"3 0 obj << /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] >> endobj\n"
+    )
+    trailer = b"trailer << /Root 1 0 R >>\n%%EOF\n"
+    padding = max(size - len(body) - len(trailer) - 2, 0)
+    return body + b"%" + b"x" * padding + b"\n" + trailer
+
+
+def seeded_report_types():
+    try:
+        con = sqlite3.connect(os.path.join(BACKEND_DIR, "datab.db"))
+        rows = con.execute("SELECT type_code, description FROM report_types").fetchall()
+        con.close()
+        return rows or DEFAULT_REPORT_TYPES
+    except sqlite3.Error:
+        return DEFAULT_REPORT_TYPES
+
+
+def build(args):
+    out = os.path.abspath(args.out)
+    if os.path.isdir(out) and os.listdir(out):
+        if not (args.force or os.path.exists(os.path.join(out, BUILD_MARKER))):
+            raise SystemExit(f"{out} is not empty and was not made by 'build'; pass --force to replace it")
+        shutil.rmtree(out)
+    elif os.path.exists(out) and not os.path.isdir(out):
+        raise SystemExit(f"{out} exists and is not a directory")
+    files_root = os.path.join(out, "etablissements")
+    os.makedirs(files_root)
+    open(os.path.join(out, BUILD_MARKER), "w").close()
+    db_path = os.path.join(out, "datab.db")
+    rng = random.Random(args.seed)
+    years = list(range(args.first_year, args.first_year + args.years))
+    start = time.perf_counter()
+
+    # the app creates the schema (migrations/) when it first opens the file
+    import app as backend
+    backend.DATABASE, backend.FILES_ROOT = db_path, files_root
+    with backend.pooled_connection():
+        pass
+
+    con = sqlite3.connect(db_path)
+
+    types = seeded_report_types()
+    with con:
+        con.executemany("INSERT INTO report_types (type_code, description) VALUES (?, ?)", types)
+        con.executemany(
+            "INSERT INTO establishments (establishment_id, name, code, description) VALUES (?, ?, ?, ?)",
+            [(i, f"Établissement {i:05d}", f"etab-{i}", "synthetic") for i in range(1, args.establishments + 1)],
+        )
+        con.execute(
+            "INSERT INTO users (email, password_hash, name, role) VALUES (?, ?, 'Admin', 'admin')",
+            (ADMIN["email"], ADMIN["password"]),
+        )
+        con.executemany(
+            "INSERT INTO users (email, password_hash, name, role, establishment_id) "
+            "VALUES (?, ?, ?, 'establishment', ?)",
+            [(f"etab{i}@bench.local", "benchpass", f"User {i}", i) for i in range(1, args.establishments + 1)],
+        )
+        con.executemany(
+            f"INSERT INTO matrix_data (establishment_id, year, {', '.join(CELLS)}) "
+            f"VALUES (?, ?, {', '.join('?' for _ in CELLS)})",
+            (
+                (i, y, *(str(rng.randint(0, 99999)) if rng.random() < args.fill else None for _ in CELLS))
+                for i in range(1, args.establishments + 1) for y in years
+            ),
+        )
+        con.executemany(
+            "INSERT INTO audit_findings (establishment_id, position, constat, recommendation, "
+            "plan, intervenant, delai, etat) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                (i, pos, finding_text(rng, 12), finding_text(rng, 10), finding_text(rng, 8),
+                 rng.choice(INTERVENANTS), f"{rng.choice(years)}-12-31", rng.choice(["ouvert", "clos"]))
+                for i in range(1, args.establishments + 1) for pos in range(args.findings)
+            ),
+        )
+        type_ids = con.execute("SELECT report_type_id, type_code FROM report_types").fetchall()
+        con.executemany(
+            "INSERT INTO reports (establishment_id, year, report_type_id, version, "
+            "original_filename, stored_filepath) VALUES (?, ?, ?, 'v1', ?, ?)",
+            (
+                (i, y, tid, f"{code.lower()}_{y}_v1.pdf",
+                 f"etab_{i}/{y}/{code}/v1/{code.lower()}_{y}_v1.pdf")
+                for i in range(1, args.establishments + 1) for y in years for tid, code in type_ids
+            ),
+        )
+
+    file_count = 0
+    if not args.no_files:
+        # one template PDF, hard linked everywhere (like the blob store does)
+        template = os.path.join(out, "template.pdf")
+        with open(template, "wb") as f:
+            f.write(make_pdf(args.pdf_size))
+        st = os.stat(template)
+        catalog = []
+        for i in range(1, args.establishments + 1):
+            for y in years:
+                for _, code in type_ids:
+                    rel = f"etab_{i}/{y}/{code}/v1/{code.lower()}_{y}_v1.pdf"
+                    path = os.path.join(files_root, rel)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    try:
+                        os.link(template, path)
+                    except OSError:
+                        shutil.copyfile(template, path)
+                    catalog.append((i, y, code, "v1", os.path.basename(rel), rel, st.st_size, st.st_mtime))
+        with con:
+            con.executemany(
+                "INSERT INTO report_files (establishment_id, year, report, version, filename, "
+                "stored_filepath, size, mtime) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                catalog,
+            )
+        file_count = len(catalog)
+    con.close()
+
+    # rollups through the app's own code so they match what it maintains
+    with backend.pooled_connection() as con:
+        with con:
+            backend.rebuild_matrix_stats(con)
+    backend.shutdown()
+
+    print(json.dumps({
+        "out": out,
+        "establishments": args.establishments,
+        "years": len(years),
+        "reportTypes": len(types),
+        "findings": args.establishments * args.findings,
+        "files": file_count,
+        "seconds": round(time.perf_counter() - start, 1),
+    }, indent=2))
+
+# --- run -------------------------------------------------------------------
+
+
+class Targets:
+    """What exists in the data set, so every generated request is valid."""
+
+    def __init__(self, db_path):
+        con = sqlite3.connect(db_path)
+        self.ids = [r[0] for r in con.execute("SELECT establishment_id FROM establishments")]
+        self.codes = [r[0] for r in con.execute("SELECT code FROM establishments")]
+        self.years = [r[0] for r in con.execute("SELECT DISTINCT year FROM matrix_data ORDER BY year")] or [2025]
+        self.files = [
+            r for r in con.execute(
+                "SELECT establishment_id, year, report, version, filename FROM report_files"
+            )
+        ] if con.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'report_files'"
+        ).fetchone() else []
+        self.report_keys = list({(f[0], f[1], f[2], f[3]) for f in self.files}) or [
+            (i, y, "PV", "v1") for i in self.ids[:10] for y in self.years
+        ]
+        con.close()
+
+
+def finding_text(rng, words):
+    return " ".join(rng.choice(FINDING_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def matrix_body(rng):
+    return json.dumps({r: [str(rng.randint(0, 9999)) for _ in COLS] for r in ROWS})
+
+
+# (label, weight, method, build(rng, targets) -> (path, body))
+MIX = [
+    ("GET /etablissement/<id>/<year>/matrix", 25, "GET",
+     lambda rng, t: (f"/etablissement/{rng.choice(t.ids)}/{rng.choice(t.years)}/matrix", None)),
+    ("GET /etablissement/<code>/<year>/matrix", 5, "GET",
+     lambda rng, t: (f"/etablissement/{rng.choice(t.codes)}/{rng.choice(t.years)}/matrix", None)),
+    ("POST /etablissement/<id>/<year>/matrix", 5, "POST",
+     lambda rng, t: (f"/etablissement/{rng.choice(t.ids)}/{rng.choice(t.years)}/matrix", matrix_body(rng))),
+    ("GET /api/report-metadata/<id>/<year>", 20, "GET",
+     lambda rng, t: (f"/api/report-metadata/{rng.choice(t.ids)}/{rng.choice(t.years)}", None)),
+    ("GET /api/report-metadata/<id>?from&to", 5, "GET",
+     lambda rng, t: (f"/api/report-metadata/{rng.choice(t.ids)}?from={t.years[0]}&to={t.years[-1]}", None)),
+    ("GET /etablissement/insert/<id>/<year>/<report>/<version>", 20, "GET",
+     lambda rng, t: ("/etablissement/insert/{}/{}/{}/{}".format(*rng.choice(t.report_keys)), None)),
+    ("GET /uploads/<id>/<year>/<report>/<version>/<file>", 10, "GET",
+     lambda rng, t: ("/uploads/{}/{}/{}/{}/{}".format(*map(quote, map(str, rng.choice(t.files)))), None)
+     if t.files else ("/api/establishments", None)),
+    ("GET /api/establishments", 5, "GET",
+     lambda rng, t: ("/api/establishments", None)),
+    ("GET /api/search?q", 5, "GET",
+     lambda rng, t: (f"/api/search?q={quote(' '.join(rng.sample(FINDING_WORDS, 2)))}", None)),
+]
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    k = max(int(round(p / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(k, len(sorted_values) - 1)]
+
+
+def summarize(samples, elapsed):
+    samples = sorted(samples)
+    return {
+        "requests": len(samples),
+        "throughput": round(len(samples) / elapsed, 1) if elapsed else None,
+        "p50_ms": round(percentile(samples, 50) * 1000, 2) if samples else None,
+        "p95_ms": round(percentile(samples, 95) * 1000, 2) if samples else None,
+        "p99_ms": round(percentile(samples, 99) * 1000, 2) if samples else None,
+        "max_ms": round(samples[-1] * 1000, 2) if samples else None,
+    }
+
+
+def client(url, targets, deadline, seed, results, errors):
+    rng = random.Random(seed)
+    parts = urlsplit(url)
+
+    def connect():
+        return http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+
+    con = connect()
+    con.request("POST", "/login", body=json.dumps(ADMIN), headers={"Content-Type": "application/json"})
+    res = con.getresponse()
+    res.read()
+    if res.status != 200:
+        errors["login"] = errors.get("login", 0) + 1
+        return
+    cookie = res.getheader("Set-Cookie", "").split(";", 1)[0]
+
+    labels, weights = [m[0] for m in MIX], [m[1] for m in MIX]
+    by_label = {m[0]: m for m in MIX}
+    local = {label: [] for label in labels}
+    while time.perf_counter() < deadline:
+        label = rng.choices(labels, weights)[0]
+        _, _, method, make = by_label[label]
+        path, body = make(rng, targets)
+        headers = {"Cookie": cookie}
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+        start = time.perf_counter()
+        try:
+            con.request(method, path, body=body, headers=headers)
+            res = con.getresponse()
+            res.read()
+        except (OSError, http.client.HTTPException):
+            errors[label] = errors.get(label, 0) + 1
+            con.close()
+            con = connect()
+            continue
+        took = time.perf_counter() - start
+        if res.status >= 400 and res.status != 404:
+            errors[label] = errors.get(label, 0) + 1
+        else:
+            local[label].append(took)
+    con.close()
+    for label, samples in local.items():
+        results[label].extend(samples)
+
+
+def start_server(data_dir):
+    """Serve the app in-process on a free port; returns (url, stop)."""
+    import logging
+    from werkzeug.serving import make_server
+    import app as backend
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    backend.DATABASE = os.path.join(data_dir, "datab.db")
+    backend.FILES_ROOT = os.path.join(data_dir, "etablissements")
+    backend.BLOB_ROOT = os.path.join(data_dir, "blobs")
+    backend.warm_up()
+    server = make_server("127.0.0.1", 0, backend.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def stop():
+        server.shutdown()
+        backend.shutdown()
+
+    return f"http://127.0.0.1:{server.server_port}", stop
+
+
+def run(args):
+    tmp = None
+    data_dir = args.data
+    if data_dir is None:
+        # never write to the seeded database: work on a copy
+        tmp = tempfile.mkdtemp()
+        shutil.copy(os.path.join(BACKEND_DIR, "datab.db"), tmp)
+        shutil.copytree(os.path.join(BACKEND_DIR, "etablissements"), os.path.join(tmp, "etablissements"))
+        data_dir = tmp
+    stop = None
+    try:
+        url = args.url
+        if url is None:
+            url, stop = start_server(data_dir)
+        targets = Targets(os.path.join(data_dir, "datab.db"))
+
+        results = {m[0]: [] for m in MIX}
+        errors = {}
+        deadline = time.perf_counter() + args.duration
+        threads = [
+            threading.Thread(target=client, args=(url, targets, deadline, args.seed + n, results, errors))
+            for n in range(args.clients)
+        ]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        report = {
+            "config": {
+                "url": args.url or "in-process",
+                "data": args.data or "seeded",
+                "clients": args.clients,
+                "duration": args.duration,
+                "establishments": len(targets.ids),
+                "years": len(targets.years),
+                "files": len(targets.files),
+            },
+            "total": summarize([s for v in results.values() for s in v], elapsed),
+            "routes": {label: summarize(samples, elapsed) for label, samples in results.items()},
+            "errors": errors,
+        }
+        text = json.dumps(report, indent=2, ensure_ascii=False)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+        print(text)
+    finally:
+        if stop:
+            stop()
+        if tmp:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("build", help="create a synthetic database and file tree")
+    p.add_argument("--out", required=True, help="directory to (re)create")
+    p.add_argument("--force", action="store_true",
+                   help="replace --out even if it is not empty and was not made by 'build'")
+    p.add_argument("--establishments", type=int, default=1000)
+    p.add_argument("--years", type=int, default=10)
+    p.add_argument("--first-year", type=int, default=2016)
+    p.add_argument("--fill", type=float, default=0.3, help="share of filled matrix cells")
+    p.add_argument("--findings", type=int, default=5, help="audit findings per establishment")
+    p.add_argument("--pdf-size", type=int, default=64 * 1024)
+    p.add_argument("--no-files", action="store_true", help="skip the etablissements/ tree")
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=build)
+
+    p = sub.add_parser("run", help="replay a request mix and report latencies as JSON")
+    p.add_argument("--data", help="directory made by 'build' (default: seeded datab.db)")
+    p.add_argument("--url", help="server to target (default: start one in-process)")
+    p.add_argument("--clients", type=int, default=8)
+    p.add_argument("--duration", type=float, default=20.0, help="seconds")
+    p.add_argument("--output", help="also write the JSON report here")
+    p.add_argument("--seed", type=int, default=1)
+    p.set_defaults(func=run)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
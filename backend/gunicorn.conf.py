@@ -0,0 +1,61 @@
+"""Production server settings: gunicorn -c gunicorn.conf.py app:app
+
+Every setting can be overridden from the environment:
+
+    WEB_BIND      address to listen on            (0.0.0.0:5000)
+    WEB_WORKERS   worker processes                (2 x CPUs + 1)
+    WEB_THREADS   threads per worker process      (4)
+    WEB_TIMEOUT   seconds before a stuck worker is restarted (60)
+    WEB_GRACEFUL  seconds in-flight requests get on shutdown  (30)
+    METRICS_DIR   where workers share /metrics snapshots (fresh temp dir)
+    JOB_WORKERS   background job threads per worker process (2)
+    JOB_QUEUE_MAX pending jobs at which uploads get 503     (500)
+    MATRIX_FEED_WAITERS matrix long-polls waiting per worker (2, < WEB_THREADS)
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = os.environ.get("WEB_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("WEB_THREADS", 4))
+worker_class = "gthread"
+timeout = int(os.environ.get("WEB_TIMEOUT", 60))
+# SIGTERM stops accepting connections and lets running requests finish.
+graceful_timeout = int(os.environ.get("WEB_GRACEFUL", 30))
+keepalive = 5
+chdir = os.path.dirname(os.path.abspath(__file__))
+accesslog = "-"
+
+
+_metrics_tmp = None
+
+
+def on_starting(server):
+    # workers inherit this and write their metric snapshots there
+    global _metrics_tmp
+    path = os.environ.get("METRICS_DIR")
+    if not path:
+        path = _metrics_tmp = tempfile.mkdtemp(prefix="backend-metrics-")
+    os.makedirs(path, exist_ok=True)
+    for name in os.listdir(path):
+        if name.endswith(".json"):
+            os.remove(os.path.join(path, name))
+    os.environ["METRICS_DIR"] = path
+
+
+def on_exit(server):
+    if _metrics_tmp:
+        shutil.rmtree(_metrics_tmp, ignore_errors=True)
+
+
+def post_worker_init(worker):
+    import app as backend
+    # one pooled connection per thread, plus caches, before taking traffic
+    backend.warm_up(connections=threads)
+
+
+def worker_exit(server, worker):
+    import app as backend
+    backend.shutdown()
@@ -0,0 +1,206 @@
+"""Background jobs backed by the jobs table (migrations/0009_jobs.sql).
+
+Work that should not hold up a request goes into the jobs table and is run
+by a fixed pool of JOB_WORKERS threads in each process. The table is the
+queue: jobs survive restarts, any worker process can claim them, and a job
+whose worker died is claimed again once its lease expires. Failed attempts,
+including those that never finished, are retried with exponential backoff up
+to JOB_MAX_ATTEMPTS.
+
+Nothing here knows about Flask: the app hands JobRunner a way to borrow a
+connection and the handler for each job kind.
+"""
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+# Uploads are refused (503) while this many jobs are waiting or running.
+JOB_QUEUE_MAX = int(os.environ.get("JOB_QUEUE_MAX", 500))
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BASE_SECONDS = 5.0
+JOB_RETRY_MAX_SECONDS = 600.0
+JOB_LEASE_SECONDS = 600.0
+# How often idle workers look for jobs queued by other processes.
+JOB_POLL_SECONDS = 2.0
+# Finished jobs are deleted after this long (when a worker process starts).
+JOB_KEEP_DONE = "-7 days"
+
+log = logging.getLogger(__name__)
+
+class PermanentJobError(Exception):
+    """Retrying will not help: the job fails at once."""
+
+JOB_CLAIM_SQL = """
+    UPDATE jobs SET status = 'running', attempts = attempts + 1,
+        locked_by = ?, locked_at = ?, updated_at = CURRENT_TIMESTAMP
+    WHERE job_id = (
+        SELECT job_id FROM jobs
+        WHERE (status = 'queued' AND run_after <= ?)
+           OR (status = 'running' AND locked_at < ? AND attempts < ?)
+        ORDER BY run_after LIMIT 1
+    )
+    RETURNING job_id, kind, payload, attempts
+"""
+
+# Jobs whose worker died (or hung) on every attempt: a file that crashes the
+# process would otherwise be claimed again forever.
+JOB_EXPIRE_SQL = """
+    UPDATE jobs SET status = 'failed', error = 'Délai de traitement dépassé',
+        locked_by = NULL, locked_at = NULL, updated_at = CURRENT_TIMESTAMP
+    WHERE status = 'running' AND locked_at < ? AND attempts >= ?
+"""
+
+def enqueue_job(con, kind, dedupe_key, payload, establishment_id=None):
+    """Queue a job in ``con``'s transaction; returns its id, or the pending duplicate's."""
+    con.execute(
+        "INSERT INTO jobs (kind, dedupe_key, payload, establishment_id, run_after) "
+        "VALUES (?, ?, ?, ?, ?) ON CONFLICT DO NOTHING",
+        (kind, dedupe_key, json.dumps(payload), establishment_id, time.time()),
+    )
+    return con.execute(
+        "SELECT job_id FROM jobs WHERE kind = ? AND dedupe_key = ? "
+        "AND status IN ('queued', 'running')",
+        (kind, dedupe_key),
+    ).fetchone()[0]
+
+def pending_job_count(con):
+    return con.execute(
+        "SELECT count(*) FROM jobs WHERE status IN ('queued', 'running')"
+    ).fetchone()[0]
+
+def retry_delay(attempts):
+    """Seconds before attempt ``attempts + 1``: doubling, capped, with jitter."""
+    delay = min(JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1), JOB_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.5, 1.0)
+
+def job_status(row):
+    """A jobs row as the API returns it."""
+    return {
+        "jobId": row["job_id"],
+        "kind": row["kind"],
+        "status": row["status"],
+        "attempts": row["attempts"],
+        "maxAttempts": JOB_MAX_ATTEMPTS,
+        "runAfter": row["run_after"],
+        "error": row["error"],
+        "result": json.loads(row["result"]) if row["result"] else None,
+        "createdAt": row["created_at"],
+        "updatedAt": row["updated_at"],
+    }
+
+class JobRunner:
+    """``workers`` threads claiming due jobs and running ``handlers[kind](payload)``.
+
+    ``connect`` is a context manager factory lending a connection whose rows
+    can be read by column name.
+    """
+
+    def __init__(self, connect, handlers, workers=JOB_WORKERS, logger=log):
+        self.connect = connect
+        self.handlers = handlers
+        self.workers = workers
+        self.logger = logger
+        self._threads = []
+        self._wake = threading.Condition()
+        self._stopping = False
+
+    def start(self):
+        if self.workers > 0 and not self._threads:
+            with self.connect() as con:
+                with con:
+                    con.execute("DELETE FROM jobs WHERE status = 'done' AND updated_at < datetime('now', ?)",
+                                (JOB_KEEP_DONE,))
+        with self._wake:
+            if self._threads or self.workers <= 0:
+                return
+            self._stopping = False
+            self._threads = [
+                threading.Thread(target=self._loop, name=f"job-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+        for t in self._threads:
+            t.start()
+
+    def stop(self, timeout=JOB_POLL_SECONDS * 5):
+        """Let running jobs finish (up to ``timeout``); the rest wait for the next start."""
+        with self._wake:
+            self._stopping = True
+            self._wake.notify_all()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def notify(self):
+        """Wake an idle worker after queueing a job."""
+        with self._wake:
+            self._wake.notify()
+
+    def _loop(self):
+        while not self._stopping:
+            try:
+                job = self._claim()
+            except sqlite3.Error:
+                self.logger.exception("claiming a job failed")
+                job = None
+            if job is None:
+                with self._wake:
+                    if not self._stopping:
+                        self._wake.wait(JOB_POLL_SECONDS)
+                continue
+            try:
+                self._run(job)
+            except Exception as exc:
+                # recording the outcome failed (database locked...): try to
+                # queue the job again; failing that, its lease brings it back
+                self.logger.exception("job %s (%s): recording the outcome failed", job["job_id"], job["kind"])
+                try:
+                    self._retry_later(job, exc)
+                except Exception:
+                    self.logger.exception("job %s (%s): requeueing failed", job["job_id"], job["kind"])
+
+    def _claim(self):
+        now = time.time()
+        with self.connect() as con:
+            with con:
+                con.execute(JOB_EXPIRE_SQL, (now - JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS))
+                return con.execute(JOB_CLAIM_SQL, (
+                    f"{os.getpid()}", now, now, now - JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS,
+                )).fetchone()
+
+    def _run(self, job):
+        job_id, kind, attempts = job["job_id"], job["kind"], job["attempts"]
+        try:
+            result = self.handlers[kind](json.loads(job["payload"]))
+        except Exception as exc:
+            if isinstance(exc, PermanentJobError) or attempts >= JOB_MAX_ATTEMPTS:
+                self.logger.error("job %s (%s) failed: %s", job_id, kind, exc)
+                self._finish(job_id, "failed", error=str(exc) or type(exc).__name__)
+            else:
+                self.logger.warning("job %s (%s) attempt %s failed: %s", job_id, kind, attempts, exc)
+                self._retry_later(job, exc)
+        else:
+            self._finish(job_id, "done", result=json.dumps(result))
+
+    def _retry_later(self, job, exc):
+        """Queue ``job`` again after its backoff, or fail it if it is out of attempts."""
+        error = str(exc) or type(exc).__name__
+        if job["attempts"] >= JOB_MAX_ATTEMPTS:
+            self._finish(job["job_id"], "failed", error=error)
+        else:
+            self._finish(job["job_id"], "queued", error=error,
+                         run_after=time.time() + retry_delay(job["attempts"]))
+
+    def _finish(self, job_id, status, error=None, result=None, run_after=None):
+        with self.connect() as con:
+            with con:
+                con.execute("""
+                    UPDATE jobs SET status = ?, error = ?, result = ?,
+                        run_after = coalesce(?, run_after), locked_by = NULL, locked_at = NULL,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE job_id = ?
+                """, (status, error, result, run_after, job_id))
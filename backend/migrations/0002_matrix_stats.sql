@@ -0,0 +1,18 @@
+-- Matrix rollups, kept up to date on every matrix write (backfilled by
+-- rebuild_matrix_stats when this migration runs).
+CREATE TABLE IF NOT EXISTS matrix_cell_stats (
+    cell   TEXT    PRIMARY KEY,
+    filled INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS matrix_year_stats (
+    year         INTEGER PRIMARY KEY,
+    matrices     INTEGER NOT NULL DEFAULT 0,
+    filled_cells INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS matrix_establishment_stats (
+    establishment_id INTEGER PRIMARY KEY REFERENCES establishments(establishment_id),
+    matrices         INTEGER NOT NULL DEFAULT 0,
+    filled_cells     INTEGER NOT NULL DEFAULT 0
+);
@@ -0,0 +1,16 @@
+-- Catalog of the files stored under etablissements/ (backfilled from disk by
+-- reconcile_report_files when this migration runs).
+CREATE TABLE IF NOT EXISTS report_files (
+    file_id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    establishment_id INTEGER NOT NULL REFERENCES establishments(establishment_id),
+    year             INTEGER NOT NULL,
+    report           TEXT    NOT NULL,
+    version          TEXT    NOT NULL,
+    filename         TEXT    NOT NULL,
+    stored_filepath  TEXT    UNIQUE NOT NULL,
+    size             INTEGER,
+    mtime            REAL,
+    uploaded_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sha256           TEXT,
+    UNIQUE(establishment_id, year, report, version, filename)
+);
@@ -0,0 +1,18 @@
+-- Audit findings imported from etablissements/etab_N/details_N.txt
+CREATE TABLE IF NOT EXISTS audit_findings (
+    finding_id       INTEGER PRIMARY KEY AUTOINCREMENT,
+    establishment_id INTEGER NOT NULL REFERENCES establishments(establishment_id),
+    position         INTEGER NOT NULL,
+    constat          TEXT,
+    recommendation   TEXT,
+    plan             TEXT,
+    intervenant      TEXT,
+    delai            TEXT,
+    etat             TEXT,
+    UNIQUE(establishment_id, position)
+);
+
+CREATE INDEX IF NOT EXISTS idx_audit_findings_etat
+    ON audit_findings(establishment_id, etat, position);
+CREATE INDEX IF NOT EXISTS idx_audit_findings_intervenant
+    ON audit_findings(establishment_id, intervenant, position);
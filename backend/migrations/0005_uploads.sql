@@ -0,0 +1,15 @@
+-- Resumable uploads (bytes are kept in blobs/partial until completed)
+CREATE TABLE IF NOT EXISTS uploads (
+    upload_id        TEXT    PRIMARY KEY,
+    establishment_id INTEGER NOT NULL REFERENCES establishments(establishment_id),
+    year             INTEGER NOT NULL,
+    report           TEXT    NOT NULL,
+    version          TEXT    NOT NULL,
+    filename         TEXT    NOT NULL,
+    size             INTEGER,
+    received         INTEGER NOT NULL DEFAULT 0,
+    sha256           TEXT,
+    status           TEXT    NOT NULL DEFAULT 'open' CHECK(status IN ('open', 'complete')),
+    created_at       TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at       TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
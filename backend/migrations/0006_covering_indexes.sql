@@ -0,0 +1,20 @@
+-- Indexes for the hot read paths; `flask check-plans` asserts they are used.
+--
+-- Report metadata, WHERE establishment_id = ? AND year = ?: already covered by
+-- the UNIQUE(establishment_id, year, report_type_id, version) index.
+
+-- Establishment directory and /api/establishments pages, in name order,
+-- answered from the index alone (the rowid is the establishment_id).
+CREATE INDEX IF NOT EXISTS idx_establishments_name_code
+    ON establishments(name, code);
+
+-- File listings per (establishment, year, report, version) by filename.
+CREATE INDEX IF NOT EXISTS idx_report_files_listing
+    ON report_files(establishment_id, year, report, version, filename, stored_filepath);
+
+-- Same columns as a UNIQUE constraint's index: only extra work on writes.
+DROP INDEX IF EXISTS idx_users_email;
+DROP INDEX IF EXISTS idx_establishments_code;
+DROP INDEX IF EXISTS idx_matrix_data_establishment_year;
+-- Prefix of UNIQUE(establishment_id, year, report_type_id, version).
+DROP INDEX IF EXISTS idx_reports_establishment_year_type;
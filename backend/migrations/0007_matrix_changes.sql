@@ -0,0 +1,17 @@
+-- Per-matrix revision numbers (optimistic concurrency for cell PATCHes) and
+-- the log of changed cells behind the matrix change feed. The
+-- matrix_data.revision column is added from Python (MIGRATION_BACKFILLS),
+-- only where it is missing.
+
+CREATE TABLE IF NOT EXISTS matrix_changes (
+    change_id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    establishment_id INTEGER NOT NULL REFERENCES establishments(establishment_id),
+    year             INTEGER NOT NULL,
+    revision         INTEGER NOT NULL,
+    cell             TEXT    NOT NULL,
+    value            TEXT,
+    changed_at       TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_matrix_changes_matrix_revision
+    ON matrix_changes(establishment_id, year, revision);
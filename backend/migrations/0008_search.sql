@@ -0,0 +1,83 @@
+-- Full-text search (FTS5) over establishments, report types and audit
+-- findings. The indexes read their text from the source tables
+-- (external content) and triggers keep them in step with every write.
+
+CREATE VIRTUAL TABLE IF NOT EXISTS establishments_fts USING fts5(
+    name, code,
+    content='establishments', content_rowid='establishment_id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS establishments_fts_insert AFTER INSERT ON establishments BEGIN
+    INSERT INTO establishments_fts (rowid, name, code)
+    VALUES (new.establishment_id, new.name, new.code);
+END;
+
+CREATE TRIGGER IF NOT EXISTS establishments_fts_delete AFTER DELETE ON establishments BEGIN
+    INSERT INTO establishments_fts (establishments_fts, rowid, name, code)
+    VALUES ('delete', old.establishment_id, old.name, old.code);
+END;
+
+CREATE TRIGGER IF NOT EXISTS establishments_fts_update AFTER UPDATE OF name, code ON establishments BEGIN
+    INSERT INTO establishments_fts (establishments_fts, rowid, name, code)
+    VALUES ('delete', old.establishment_id, old.name, old.code);
+    INSERT INTO establishments_fts (rowid, name, code)
+    VALUES (new.establishment_id, new.name, new.code);
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS report_types_fts USING fts5(
+    type_code, description,
+    content='report_types', content_rowid='report_type_id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS report_types_fts_insert AFTER INSERT ON report_types BEGIN
+    INSERT INTO report_types_fts (rowid, type_code, description)
+    VALUES (new.report_type_id, new.type_code, new.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS report_types_fts_delete AFTER DELETE ON report_types BEGIN
+    INSERT INTO report_types_fts (report_types_fts, rowid, type_code, description)
+    VALUES ('delete', old.report_type_id, old.type_code, old.description);
+END;
+
+CREATE TRIGGER IF NOT EXISTS report_types_fts_update AFTER UPDATE OF type_code, description ON report_types BEGIN
+    INSERT INTO report_types_fts (report_types_fts, rowid, type_code, description)
+    VALUES ('delete', old.report_type_id, old.type_code, old.description);
+    INSERT INTO report_types_fts (rowid, type_code, description)
+    VALUES (new.report_type_id, new.type_code, new.description);
+END;
+
+-- establishment_id is indexed as a token so that one establishment's
+-- findings are a doclist intersection rather than a lookup per match; it
+-- gets no weight in the bm25 rank.
+CREATE VIRTUAL TABLE IF NOT EXISTS audit_findings_fts USING fts5(
+    constat, recommendation, plan, intervenant, establishment_id,
+    content='audit_findings', content_rowid='finding_id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS audit_findings_fts_insert AFTER INSERT ON audit_findings BEGIN
+    INSERT INTO audit_findings_fts (rowid, constat, recommendation, plan, intervenant, establishment_id)
+    VALUES (new.finding_id, new.constat, new.recommendation, new.plan, new.intervenant, new.establishment_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS audit_findings_fts_delete AFTER DELETE ON audit_findings BEGIN
+    INSERT INTO audit_findings_fts (audit_findings_fts, rowid, constat, recommendation, plan, intervenant, establishment_id)
+    VALUES ('delete', old.finding_id, old.constat, old.recommendation, old.plan, old.intervenant, old.establishment_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS audit_findings_fts_update
+AFTER UPDATE OF constat, recommendation, plan, intervenant, establishment_id ON audit_findings BEGIN
+    INSERT INTO audit_findings_fts (audit_findings_fts, rowid, constat, recommendation, plan, intervenant, establishment_id)
+    VALUES ('delete', old.finding_id, old.constat, old.recommendation, old.plan, old.intervenant, old.establishment_id);
+    INSERT INTO audit_findings_fts (rowid, constat, recommendation, plan, intervenant, establishment_id)
+    VALUES (new.finding_id, new.constat, new.recommendation, new.plan, new.intervenant, new.establishment_id);
+END;
+
+INSERT INTO audit_findings_fts (audit_findings_fts, rank) VALUES ('rank', 'bm25(1.0, 1.0, 1.0, 1.0, 0.0)');
+
+-- index what is already there
+INSERT INTO establishments_fts (establishments_fts) VALUES ('rebuild');
+INSERT INTO report_types_fts (report_types_fts) VALUES ('rebuild');
+INSERT INTO audit_findings_fts (audit_findings_fts) VALUES ('rebuild');
@@ -0,0 +1,88 @@
+-- Background jobs (post-upload PDF processing). Rows outlive the process
+-- that queued them: a restarted server picks up queued work, and jobs whose
+-- worker died are claimed again once their lease runs out.
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind             TEXT    NOT NULL,
+    dedupe_key       TEXT    NOT NULL,
+    payload          TEXT    NOT NULL,
+    establishment_id INTEGER REFERENCES establishments(establishment_id),
+    status           TEXT    NOT NULL DEFAULT 'queued'
+                     CHECK(status IN ('queued', 'running', 'done', 'failed')),
+    attempts         INTEGER NOT NULL DEFAULT 0,
+    run_after        REAL    NOT NULL,
+    locked_by        TEXT,
+    locked_at        REAL,
+    error            TEXT,
+    result           TEXT,
+    created_at       TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at       TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_jobs_due ON jobs(status, run_after);
+CREATE INDEX IF NOT EXISTS idx_jobs_establishment ON jobs(establishment_id, job_id);
+-- at most one pending job per piece of work
+CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_pending
+    ON jobs(kind, dedupe_key) WHERE status IN ('queued', 'running');
+
+-- What processing found out about each stored PDF, by content hash.
+CREATE TABLE IF NOT EXISTS pdf_documents (
+    document_id  INTEGER PRIMARY KEY AUTOINCREMENT,
+    sha256       TEXT    UNIQUE NOT NULL,
+    valid        INTEGER NOT NULL,
+    pages        INTEGER,
+    text         TEXT,
+    preview      TEXT,
+    error        TEXT,
+    processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_report_files_sha256 ON report_files(sha256);
+
+-- Extracted text, searchable per report file (a blob shared by several
+-- files is indexed once for each, under that file's establishment).
+CREATE VIEW IF NOT EXISTS report_file_texts AS
+    SELECT f.file_id, d.text, f.establishment_id
+    FROM report_files f JOIN pdf_documents d ON d.sha256 = f.sha256;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS report_files_fts USING fts5(
+    text, establishment_id,
+    content='report_file_texts', content_rowid='file_id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+
+INSERT INTO report_files_fts (report_files_fts, rank) VALUES ('rank', 'bm25(1.0, 0.0)');
+
+CREATE TRIGGER IF NOT EXISTS report_files_fts_insert AFTER INSERT ON report_files BEGIN
+    INSERT INTO report_files_fts (rowid, text, establishment_id)
+    SELECT new.file_id, d.text, new.establishment_id FROM pdf_documents d WHERE d.sha256 = new.sha256;
+END;
+
+CREATE TRIGGER IF NOT EXISTS report_files_fts_delete AFTER DELETE ON report_files BEGIN
+    INSERT INTO report_files_fts (report_files_fts, rowid, text, establishment_id)
+    SELECT 'delete', old.file_id, d.text, old.establishment_id FROM pdf_documents d WHERE d.sha256 = old.sha256;
+END;
+
+CREATE TRIGGER IF NOT EXISTS report_files_fts_update AFTER UPDATE OF sha256, establishment_id ON report_files BEGIN
+    INSERT INTO report_files_fts (report_files_fts, rowid, text, establishment_id)
+    SELECT 'delete', old.file_id, d.text, old.establishment_id FROM pdf_documents d WHERE d.sha256 = old.sha256;
+    INSERT INTO report_files_fts (rowid, text, establishment_id)
+    SELECT new.file_id, d.text, new.establishment_id FROM pdf_documents d WHERE d.sha256 = new.sha256;
+END;
+
+CREATE TRIGGER IF NOT EXISTS pdf_documents_fts_insert AFTER INSERT ON pdf_documents BEGIN
+    INSERT INTO report_files_fts (rowid, text, establishment_id)
+    SELECT f.file_id, new.text, f.establishment_id FROM report_files f WHERE f.sha256 = new.sha256;
+END;
+
+CREATE TRIGGER IF NOT EXISTS pdf_documents_fts_delete AFTER DELETE ON pdf_documents BEGIN
+    INSERT INTO report_files_fts (report_files_fts, rowid, text, establishment_id)
+    SELECT 'delete', f.file_id, old.text, f.establishment_id FROM report_files f WHERE f.sha256 = old.sha256;
+END;
+
+CREATE TRIGGER IF NOT EXISTS pdf_documents_fts_update AFTER UPDATE OF text ON pdf_documents BEGIN
+    INSERT INTO report_files_fts (report_files_fts, rowid, text, establishment_id)
+    SELECT 'delete', f.file_id, old.text, f.establishment_id FROM report_files f WHERE f.sha256 = old.sha256;
+    INSERT INTO report_files_fts (rowid, text, establishment_id)
+    SELECT f.file_id, new.text, f.establishment_id FROM report_files f WHERE f.sha256 = new.sha256;
+END;
@@ -0,0 +1,55 @@
+-- Versions behind the response cache's ETags, shared by every worker
+-- process. Triggers bump them in the transaction that changes the data, so
+-- writes from the app, the CLI or another process all count. Matrix ETags
+-- use matrix_data.revision instead.
+CREATE TABLE IF NOT EXISTS cache_versions (
+    resource TEXT    PRIMARY KEY,
+    version  INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS establishments_cache_insert AFTER INSERT ON establishments BEGIN
+    INSERT INTO cache_versions VALUES ('establishments', 1)
+    ON CONFLICT(resource) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS establishments_cache_update AFTER UPDATE ON establishments BEGIN
+    INSERT INTO cache_versions VALUES ('establishments', 1)
+    ON CONFLICT(resource) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS establishments_cache_delete AFTER DELETE ON establishments BEGIN
+    INSERT INTO cache_versions VALUES ('establishments', 1)
+    ON CONFLICT(resource) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS report_types_cache_insert AFTER INSERT ON report_types BEGIN
+    INSERT INTO cache_versions VALUES ('report_types', 1)
+    ON CONFLICT(resource) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS report_types_cache_update AFTER UPDATE ON report_types BEGIN
+    INSERT INTO cache_versions VALUES ('report_types', 1)
+    ON CONFLICT(resource) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS report_types_cache_delete AFTER DELETE ON report_types BEGIN
+    INSERT INTO cache_versions VALUES ('report_types', 1)
+    ON CONFLICT(resource) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS reports_cache_insert AFTER INSERT ON reports BEGIN
+    INSERT INTO cache_versions VALUES ('reports/' || new.establishment_id, 1)
+    ON CONFLICT(resource) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS reports_cache_update AFTER UPDATE ON reports BEGIN
+    INSERT INTO cache_versions VALUES ('reports/' || old.establishment_id, 1)
+    ON CONFLICT(resource) DO UPDATE SET version = version + 1;
+    INSERT INTO cache_versions VALUES ('reports/' || new.establishment_id, 1)
+    ON CONFLICT(resource) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS reports_cache_delete AFTER DELETE ON reports BEGIN
+    INSERT INTO cache_versions VALUES ('reports/' || old.establishment_id, 1)
+    ON CONFLICT(resource) DO UPDATE SET version = version + 1;
+END;
@@ -0,0 +1,69 @@
+"""What the process_pdf job finds out about one stored file.
+
+Checks that it is a PDF, counts its pages, extracts its text with pypdf and
+renders a first-page preview with poppler's pdftoppm (skipped when pdftoppm
+is not installed). Works on paths only; the app records the results.
+"""
+import os
+import secrets
+import shutil
+import subprocess
+
+import pypdf
+
+from jobs import PermanentJobError
+
+PDF_TEXT_MAX_CHARS = 1_000_000
+PDF_PREVIEW_WIDTH = 400
+PDF_PREVIEW_TIMEOUT = 60
+
+def read_pdf(path):
+    """(pages, text); PermanentJobError if pypdf cannot read the file."""
+    try:
+        reader = pypdf.PdfReader(path)
+        pages = len(reader.pages)
+        text, size = [], 0
+        for page in reader.pages:
+            text.append(page.extract_text() or "")
+            size += len(text[-1])
+            if size >= PDF_TEXT_MAX_CHARS:
+                break
+    except pypdf.errors.PyPdfError as exc:
+        raise PermanentJobError(f"PDF illisible : {exc}")
+    return pages, "\n".join(text)[:PDF_TEXT_MAX_CHARS]
+
+def render_preview(path, target):
+    """Write the first page of ``path`` as a PNG at ``target``; False without pdftoppm."""
+    tool = shutil.which("pdftoppm")
+    if tool is None:
+        return False
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    prefix = f"{target}.{secrets.token_hex(4)}"
+    try:
+        subprocess.run(
+            [tool, "-png", "-f", "1", "-l", "1", "-singlefile",
+             "-scale-to", str(PDF_PREVIEW_WIDTH), path, prefix],
+            check=True, capture_output=True, timeout=PDF_PREVIEW_TIMEOUT,
+        )
+    except subprocess.CalledProcessError:
+        # pdftoppm rejects the file: a preview is not worth failing the job
+        return False
+    os.replace(f"{prefix}.png", target)
+    return True
+
+def inspect_pdf(path, preview_target):
+    """{"valid", "pages", "text", "preview", "error"} for the file at ``path``.
+
+    ``preview`` says whether a preview was written to ``preview_target``.
+    """
+    with open(path, "rb") as f:
+        head = f.read(1024)
+    if b"%PDF-" not in head:
+        return {"valid": False, "pages": None, "text": "", "preview": False,
+                "error": "Le fichier n'est pas un PDF"}
+    try:
+        pages, text = read_pdf(path)
+    except PermanentJobError as exc:
+        return {"valid": False, "pages": None, "text": "", "preview": False, "error": str(exc)}
+    return {"valid": True, "pages": pages, "text": text,
+            "preview": render_preview(path, preview_target), "error": None}
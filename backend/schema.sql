@@ -1,3 +1,6 @@
+-- Reference copy of the schema once every migration in migrations/ has run.
+-- The backend creates and upgrades databases from migrations/ (flask migrate).
+
 -- Table users
 CREATE TABLE users (
     user_id         INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -30,6 +33,7 @@ CREATE TABLE matrix_data (
     CC_IC TEXT, CC_OB TEXT, CC_REC TEXT, CC_CA TEXT, CC_DD TEXT, CC_DA TEXT,
     last_updated_at  TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     last_updated_by  INTEGER REFERENCES users(user_id),
+    revision         INTEGER NOT NULL DEFAULT 0,
     UNIQUE(establishment_id,year)
 );
 
@@ -54,8 +58,154 @@ CREATE TABLE reports (
     UNIQUE(establishment_id,year,report_type_id,version)
 );
 
--- Indexes
-CREATE INDEX idx_users_email                ON users(email);
-CREATE INDEX idx_establishments_code        ON establishments(code);
-CREATE INDEX idx_matrix_data_establishment_year ON matrix_data(establishment_id,year);
-CREATE INDEX idx_reports_establishment_year_type ON reports(establishment_id,year,report_type_id);
+-- Matrix rollups (maintained by the backend on every matrix write)
+CREATE TABLE matrix_cell_stats (
+    cell   TEXT    PRIMARY KEY,
+    filled INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE matrix_year_stats (
+    year         INTEGER PRIMARY KEY,
+    matrices     INTEGER NOT NULL DEFAULT 0,
+    filled_cells INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE matrix_establishment_stats (
+    establishment_id INTEGER PRIMARY KEY REFERENCES establishments(establishment_id),
+    matrices         INTEGER NOT NULL DEFAULT 0,
+    filled_cells     INTEGER NOT NULL DEFAULT 0
+);
+
+-- Catalog of the files stored under etablissements/ (one row per upload)
+CREATE TABLE report_files (
+    file_id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    establishment_id INTEGER NOT NULL REFERENCES establishments(establishment_id),
+    year             INTEGER NOT NULL,
+    report           TEXT    NOT NULL,
+    version          TEXT    NOT NULL,
+    filename         TEXT    NOT NULL,
+    stored_filepath  TEXT    UNIQUE NOT NULL,
+    size             INTEGER,
+    mtime            REAL,
+    uploaded_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sha256           TEXT,
+    UNIQUE(establishment_id, year, report, version, filename)
+);
+
+-- Audit findings imported from etablissements/etab_N/details_N.txt
+CREATE TABLE audit_findings (
+    finding_id       INTEGER PRIMARY KEY AUTOINCREMENT,
+    establishment_id INTEGER NOT NULL REFERENCES establishments(establishment_id),
+    position         INTEGER NOT NULL,
+    constat          TEXT,
+    recommendation   TEXT,
+    plan             TEXT,
+    intervenant      TEXT,
+    delai            TEXT,
+    etat             TEXT,
+    UNIQUE(establishment_id, position)
+);
+
+-- Resumable uploads (bytes are kept in blobs/partial until completed)
+CREATE TABLE uploads (
+    upload_id        TEXT    PRIMARY KEY,
+    establishment_id INTEGER NOT NULL REFERENCES establishments(establishment_id),
+    year             INTEGER NOT NULL,
+    report           TEXT    NOT NULL,
+    version          TEXT    NOT NULL,
+    filename         TEXT    NOT NULL,
+    size             INTEGER,
+    received         INTEGER NOT NULL DEFAULT 0,
+    sha256           TEXT,
+    status           TEXT    NOT NULL DEFAULT 'open' CHECK(status IN ('open', 'complete')),
+    created_at       TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at       TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Cell changes per matrix revision (the last 500 revisions are kept)
+CREATE TABLE matrix_changes (
+    change_id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    establishment_id INTEGER NOT NULL REFERENCES establishments(establishment_id),
+    year             INTEGER NOT NULL,
+    revision         INTEGER NOT NULL,
+    cell             TEXT    NOT NULL,
+    value            TEXT,
+    changed_at       TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Indexes (UNIQUE constraints above already index users.email,
+-- establishments.code/name, matrix_data and reports lookups)
+CREATE INDEX idx_establishments_name_code   ON establishments(name,code);
+CREATE INDEX idx_report_files_listing       ON report_files(establishment_id,year,report,version,filename,stored_filepath);
+CREATE INDEX idx_audit_findings_etat        ON audit_findings(establishment_id,etat,position);
+CREATE INDEX idx_audit_findings_intervenant ON audit_findings(establishment_id,intervenant,position);
+CREATE INDEX idx_matrix_changes_matrix_revision ON matrix_changes(establishment_id,year,revision);
+
+-- Full-text search (external content FTS5 indexes; triggers in
+-- migrations/0008_search.sql keep them in step with the tables)
+CREATE VIRTUAL TABLE establishments_fts USING fts5(
+    name, code,
+    content='establishments', content_rowid='establishment_id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE VIRTUAL TABLE report_types_fts USING fts5(
+    type_code, description,
+    content='report_types', content_rowid='report_type_id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE VIRTUAL TABLE audit_findings_fts USING fts5(
+    constat, recommendation, plan, intervenant, establishment_id,
+    content='audit_findings', content_rowid='finding_id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+
+-- Background jobs (post-upload PDF processing)
+CREATE TABLE jobs (
+    job_id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind             TEXT    NOT NULL,
+    dedupe_key       TEXT    NOT NULL,
+    payload          TEXT    NOT NULL,
+    establishment_id INTEGER REFERENCES establishments(establishment_id),
+    status           TEXT    NOT NULL DEFAULT 'queued'
+                     CHECK(status IN ('queued', 'running', 'done', 'failed')),
+    attempts         INTEGER NOT NULL DEFAULT 0,
+    run_after        REAL    NOT NULL,
+    locked_by        TEXT,
+    locked_at        REAL,
+    error            TEXT,
+    result           TEXT,
+    created_at       TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at       TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_jobs_due           ON jobs(status,run_after);
+CREATE INDEX idx_jobs_establishment ON jobs(establishment_id,job_id);
+CREATE UNIQUE INDEX idx_jobs_pending ON jobs(kind,dedupe_key) WHERE status IN ('queued','running');
+
+-- Processing results per stored PDF (by content hash)
+CREATE TABLE pdf_documents (
+    document_id  INTEGER PRIMARY KEY AUTOINCREMENT,
+    sha256       TEXT    UNIQUE NOT NULL,
+    valid        INTEGER NOT NULL,
+    pages        INTEGER,
+    text         TEXT,
+    preview      TEXT,
+    error        TEXT,
+    processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_report_files_sha256 ON report_files(sha256);
+
+-- Extracted text per report file, searchable (triggers in migrations/0009_jobs.sql)
+CREATE VIEW report_file_texts AS
+    SELECT f.file_id, d.text, f.establishment_id
+    FROM report_files f JOIN pdf_documents d ON d.sha256 = f.sha256;
+CREATE VIRTUAL TABLE report_files_fts USING fts5(
+    text, establishment_id,
+    content='report_file_texts', content_rowid='file_id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+
+-- Versions behind the response cache's ETags (triggers in migrations/0010_cache_versions.sql)
+CREATE TABLE cache_versions (
+    resource TEXT    PRIMARY KEY,
+    version  INTEGER NOT NULL
+) WITHOUT ROWID;
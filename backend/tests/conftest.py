@@ -0,0 +1,43 @@
+"""Fixtures: the app on a temporary copy of datab.db and etablissements/."""
+import os
+import shutil
+import sqlite3
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import app as backend  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def data_dir(tmp_path_factory):
+    """One data set for the whole run; tests use their own matrices/files."""
+    root = tmp_path_factory.mktemp("data")
+    shutil.copy(os.path.join(BACKEND_DIR, "datab.db"), root / "datab.db")
+    shutil.copytree(os.path.join(BACKEND_DIR, "etablissements"), root / "etablissements")
+    backend.DATABASE = str(root / "datab.db")
+    backend.FILES_ROOT = str(root / "etablissements")
+    backend.BLOB_ROOT = str(root / "blobs")
+    yield root
+    backend.shutdown()
+
+
+@pytest.fixture(scope="session")
+def login(data_dir):
+    """login(email) -> test client with that user's session."""
+    def make(email):
+        con = sqlite3.connect(backend.DATABASE)
+        password = con.execute("SELECT password_hash FROM users WHERE email = ?", (email,)).fetchone()[0]
+        con.close()
+        client = backend.app.test_client()
+        assert client.post("/login", json={"email": email, "password": password}).status_code == 200
+        return client
+    return make
+
+
+@pytest.fixture
+def admin(login):
+    return login("admin@agro.com")
@@ -0,0 +1,52 @@
+"""POST /api/matrices: many matrices in one transaction, all or nothing."""
+import app as backend
+
+YEAR = 2061
+
+
+def cells(value):
+    return {row: [value] * len(backend.COLS) for row in backend.ROWS}
+
+
+def stored(etab_id, year):
+    with backend.pooled_connection() as con:
+        return con.execute("SELECT AE_IC FROM matrix_data WHERE establishment_id = ? AND year = ?",
+                           (etab_id, year)).fetchone()
+
+
+def test_saves_by_id_and_code(admin):
+    code = backend.establishments.by_id(2)[2]
+    body = {"matrices": [
+        {"id": 1, "year": YEAR, "matrix": cells("1")},
+        {"code": code, "year": YEAR, "matrix": cells("2")},
+    ]}
+    response = admin.post("/api/matrices", json=body)
+    assert response.status_code == 200 and response.get_json()["count"] == 2
+    assert stored(1, YEAR)[0] == "1" and stored(2, YEAR)[0] == "2"
+
+
+def test_rejects_bad_items_without_writing(admin):
+    good = {"id": 3, "year": YEAR + 1, "matrix": cells("x")}
+    cases = [
+        ({"id": True, "year": YEAR + 1, "matrix": cells("y")}, 400),
+        ({"id": 3, "year": True, "matrix": cells("y")}, 400),
+        ({"id": 99999, "year": YEAR + 1, "matrix": cells("y")}, 404),
+        ({"code": "no-such-code", "year": YEAR + 1, "matrix": cells("y")}, 404),
+        ({"id": 3, "year": YEAR + 1, "matrix": {"AE": [{}] * 6}}, 400),
+    ]
+    for bad, status in cases:
+        response = admin.post("/api/matrices", json={"matrices": [good, bad]})
+        assert response.status_code == status, bad
+        assert response.get_json()["index"] == 1
+    assert stored(3, YEAR + 1) is None
+    assert stored(99999, YEAR + 1) is None
+    for body in ([1], {"matrices": {}}, None):
+        assert admin.post("/api/matrices", json=body).status_code == 400
+
+
+def test_establishment_user_only_writes_its_own(login):
+    client = login("training@formation.ma")
+    body = {"matrices": [{"id": 1, "year": YEAR + 2, "matrix": cells("z")}]}
+    assert client.post("/api/matrices", json=body).status_code == 403
+    body = {"matrices": [{"id": 4, "year": YEAR + 2, "matrix": cells("z")}]}
+    assert client.post("/api/matrices", json=body).status_code == 200
@@ -0,0 +1,64 @@
+"""GET /api/export/<id>: a streamed ZIP of an establishment's PDFs and matrices."""
+import csv
+import io
+import json
+import os
+import zipfile
+
+import app as backend
+
+PDFS = [
+    "2020/CE/v1/Chapitre3.pdf",
+    "2021/CE/v1/Hackathon Maroc Competences-1.pdf",
+    "2023/RAPPORT_ANNUEL/v1/Hackathon Maroc Competences-1.pdf",
+    "2023/RAPPORT_ANNUEL/v2/Projet_2025.pdf",
+    "2023/default/v1/Hackathon Maroc Competences-1.pdf",
+]
+
+
+def save_matrix(client, etab_id, year, value):
+    matrix = {row: [value] * len(backend.COLS) for row in backend.ROWS}
+    body = {"matrices": [{"id": etab_id, "year": year, "matrix": matrix}]}
+    assert client.post("/api/matrices", json=body).status_code == 200
+
+
+def export(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.mimetype == "application/zip"
+    return zipfile.ZipFile(io.BytesIO(response.data))
+
+
+def test_zip_layout(admin):
+    save_matrix(admin, 5, 2022, "7")
+    zf = export(admin, "/api/export/5?from=2020&to=2023")
+    assert zf.namelist() == ["matrices.csv", *PDFS]
+    assert zf.testzip() is None
+    for name in PDFS:
+        info = zf.getinfo(name)
+        assert info.compress_type == zipfile.ZIP_STORED
+        with open(os.path.join(backend.FILES_ROOT, "etab_5", name), "rb") as f:
+            assert zf.read(name) == f.read()
+    rows = list(csv.reader(io.StringIO(zf.read("matrices.csv").decode())))
+    assert rows[0] == ["year", *backend.MATRIX_CELLS]
+    assert all(2020 <= int(r[0]) <= 2023 for r in rows[1:])
+    assert ["2022", *["7"] * len(backend.MATRIX_CELLS)] in rows
+
+    zf = export(admin, "/api/export/5?from=2023&to=2023&format=json")
+    assert zf.namelist() == ["matrices.json", *(p for p in PDFS if p.startswith("2023/"))]
+    assert json.loads(zf.read("matrices.json"))["id"] == 5
+
+
+def test_bad_requests(admin):
+    assert admin.get("/api/export/5?format=xml").status_code == 400
+    assert admin.get("/api/export/99999").status_code == 404
+    assert admin.get("/api/export/no-such-code").status_code == 404
+
+
+def test_establishment_user_exports_only_its_own(login):
+    client = login("training@formation.ma")
+    assert client.get("/api/export/5").status_code == 403
+    code = backend.establishments.by_id(5)[2]
+    assert client.get(f"/api/export/{code}").status_code == 403
+    zf = export(client, "/api/export/4")
+    assert "2024/default/v1/Hackathon Maroc Competences-1.pdf" in zf.namelist()
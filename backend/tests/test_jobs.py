@@ -0,0 +1,104 @@
+"""Uploads queue a process_pdf job; the runner records what it found."""
+import io
+import os
+import sqlite3
+import time
+
+import app as backend
+import jobs
+
+
+def run_due_jobs():
+    """Run every due job in this thread instead of the worker threads."""
+    runner = jobs.JobRunner(backend.pooled_connection, backend.JOB_HANDLERS, workers=0)
+    while (job := runner._claim()) is not None:
+        runner._run(job)
+
+
+def upload(client, data, name):
+    return client.post("/saveFile/1/2024/PV/v1", data={"file": (io.BytesIO(data), name)},
+                       content_type="multipart/form-data")
+
+
+def test_uploaded_pdf_is_processed(admin, data_dir):
+    with open(os.path.join(backend.FILES_ROOT, "etab_1/2025/default/v1/Projet_2025.pdf"), "rb") as f:
+        response = upload(admin, f.read(), "projet.pdf")
+    assert response.status_code == 200
+    body = response.get_json()
+    run_due_jobs()
+
+    job = admin.get(f"/api/jobs/{body['jobId']}").get_json()
+    assert job["status"] == "done" and job["attempts"] == 1
+    document = admin.get(f"/api/documents/{body['sha256']}").get_json()
+    assert document["valid"] is True
+    assert document["pages"] >= 1 and document["textChars"] > 0
+
+
+def test_file_that_is_not_a_pdf_is_flagged(admin):
+    response = upload(admin, b"hello, not a pdf", "fake.pdf")
+    body = response.get_json()
+    run_due_jobs()
+
+    assert admin.get(f"/api/jobs/{body['jobId']}").get_json()["status"] == "done"
+    document = admin.get(f"/api/documents/{body['sha256']}").get_json()
+    assert document["valid"] is False and document["error"]
+
+
+def test_failed_attempt_is_queued_again(admin):
+    runner = jobs.JobRunner(backend.pooled_connection, {"boom": lambda payload: 1 / 0}, workers=0)
+    with backend.pooled_connection() as con:
+        with con:
+            job_id = jobs.enqueue_job(con, "boom", "k", {})
+            assert jobs.enqueue_job(con, "boom", "k", {}) == job_id
+    try:
+        runner._run(runner._claim())
+        job = admin.get(f"/api/jobs/{job_id}").get_json()
+        assert job["status"] == "queued" and "division" in job["error"]
+    finally:
+        with backend.pooled_connection() as con:
+            with con:
+                con.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+
+def test_worker_survives_a_failed_finish(admin, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_RETRY_BASE_SECONDS", 0.01)
+    monkeypatch.setattr(jobs, "JOB_POLL_SECONDS", 0.05)
+
+    class LockedOnce(jobs.JobRunner):
+        failures = 1
+
+        def _finish(self, *args, **kwargs):
+            if self.failures:
+                self.failures -= 1
+                raise sqlite3.OperationalError("database is locked")
+            super()._finish(*args, **kwargs)
+
+    runner = LockedOnce(backend.pooled_connection, {**backend.JOB_HANDLERS, "ok": lambda payload: 1},
+                        workers=1)
+    with backend.pooled_connection() as con:
+        with con:
+            job_id = jobs.enqueue_job(con, "ok", "survivor", {})
+    runner.start()
+    try:
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            job = admin.get(f"/api/jobs/{job_id}").get_json()
+            if job["status"] == "done":
+                break
+            time.sleep(0.02)
+        assert job["status"] == "done" and job["attempts"] == 2
+        assert all(t.is_alive() for t in runner._threads)
+    finally:
+        runner.stop()
+
+
+def test_expired_lease_out_of_attempts_fails(admin):
+    with backend.pooled_connection() as con:
+        with con:
+            job_id = jobs.enqueue_job(con, "process_pdf", "hung", {})
+            con.execute("UPDATE jobs SET status = 'running', attempts = ?, locked_at = 0 WHERE job_id = ?",
+                        (jobs.JOB_MAX_ATTEMPTS, job_id))
+    runner = jobs.JobRunner(backend.pooled_connection, backend.JOB_HANDLERS, workers=0)
+    assert runner._claim() is None
+    job = admin.get(f"/api/jobs/{job_id}").get_json()
+    assert job["status"] == "failed" and job["error"]
@@ -0,0 +1,78 @@
+"""Matrix revisions: one per write, cell PATCH checks, the long-poll cap."""
+import threading
+import time
+
+import app as backend
+
+YEAR = 2041
+
+
+def cells(value):
+    return {row: [value] * len(backend.COLS) for row in backend.ROWS}
+
+
+def test_concurrent_writes_get_distinct_revisions(login):
+    results, errors = [], []
+
+    def writer(seed):
+        client = login("admin@agro.com")
+        for n in range(25):
+            # every write differs from every other one, so each is a new revision
+            response = client.post(f"/etablissement/3/{YEAR}/matrix", json=cells(f"{seed}-{n}"))
+            if response.status_code == 200:
+                results.append(response.get_json()["revision"])
+            else:
+                errors.append(response.status_code)
+
+    threads = [threading.Thread(target=writer, args=(seed,)) for seed in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert sorted(results) == list(range(1, len(results) + 1))
+
+    with backend.pooled_connection() as con:
+        stored = con.execute(
+            "SELECT revision FROM matrix_data WHERE establishment_id = 3 AND year = ?", (YEAR,)
+        ).fetchone()[0]
+        logged = [r[0] for r in con.execute(
+            "SELECT DISTINCT revision FROM matrix_changes WHERE establishment_id = 3 AND year = ? "
+            "ORDER BY revision", (YEAR,))]
+    assert stored == len(results)
+    assert logged == list(range(1, stored + 1))
+
+
+def test_patch_checks_revision_and_values(admin):
+    url = f"/etablissement/4/{YEAR}/matrix"
+    first = admin.patch(url, json={"revision": 0, "cells": {"AE_IC": "7"}})
+    assert first.status_code == 200 and first.get_json()["revision"] == 1
+    stale = admin.patch(url, json={"revision": 0, "cells": {"AE_IC": "8"}})
+    assert stale.status_code == 409 and stale.get_json()["revision"] == 1
+    for bad in ({"x": 1}, [1], True):
+        response = admin.patch(url, json={"revision": 1, "cells": {"AE_IC": bad}})
+        assert response.status_code == 400
+    for body in ([1], "AE_IC", None, {"revision": True, "cells": {"AE_IC": "1"}}):
+        assert admin.patch(url, json=body).status_code == 400
+    feed = admin.get(f"{url}/changes?since=0").get_json()
+    assert feed == {"revision": 1, "changes": {"AE_IC": "7"}, "reset": False}
+
+
+def test_long_polls_past_the_cap_answer_at_once(login):
+    url = f"/etablissement/5/{YEAR}/matrix/changes?since=0&wait=2"
+    clients = [login("admin@agro.com") for _ in range(backend.MATRIX_FEED_WAITERS + 1)]
+    started = time.monotonic()
+    durations = []
+
+    def poll(client):
+        assert client.get(url).status_code == 200
+        durations.append(time.monotonic() - started)
+
+    threads = [threading.Thread(target=poll, args=(c,)) for c in clients]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    durations.sort()
+    assert durations[0] < 1
+    assert all(d >= 1.9 for d in durations[1:])
@@ -0,0 +1,68 @@
+"""The incremental rollups must always equal a full recount."""
+import random
+import threading
+
+import app as backend
+
+YEAR = 2031
+
+
+def random_matrix(rng):
+    return {row: [rng.choice(["", "", str(rng.randint(1, 99))]) for _ in backend.COLS]
+            for row in backend.ROWS}
+
+
+def assert_stats_match():
+    with backend.pooled_connection() as con:
+        assert backend.read_matrix_stats(con) == backend.compute_matrix_stats(con)
+
+
+def test_sequential_writes(admin):
+    rng = random.Random(1)
+    for _ in range(30):
+        etab = rng.randint(1, 5)
+        assert admin.post(f"/etablissement/{etab}/{YEAR}/matrix", json=random_matrix(rng)).status_code == 200
+    body = {"matrices": [{"id": i, "year": YEAR + 1, "matrix": random_matrix(rng)} for i in range(1, 6)]}
+    assert admin.post("/api/matrices", json=body).status_code == 200
+    # emptying a whole matrix takes its cells back out of the counts
+    empty = {row: [""] * len(backend.COLS) for row in backend.ROWS}
+    assert admin.post(f"/etablissement/1/{YEAR}/matrix", json=empty).status_code == 200
+    assert_stats_match()
+
+
+def test_concurrent_writes_to_one_matrix(login):
+    errors = []
+
+    def writer(seed):
+        rng = random.Random(seed)
+        client = login("admin@agro.com")
+        for _ in range(40):
+            response = client.post(f"/etablissement/2/{YEAR + 2}/matrix", json=random_matrix(rng))
+            if response.status_code != 200:
+                errors.append(response.status_code)
+
+    threads = [threading.Thread(target=writer, args=(seed,)) for seed in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert_stats_match()
+
+
+def test_establishment_breakdown_is_paged(admin, login):
+    assert "establishments" not in admin.get("/api/stats").get_json()
+    with backend.pooled_connection() as con:
+        _, _, expected = backend.compute_matrix_stats(con)
+
+    seen, url = {}, "/api/stats/establishments?limit=2"
+    while url:
+        body = admin.get(url).get_json()
+        assert len(body["establishments"]) <= 2
+        for entry in body["establishments"]:
+            seen[entry["id"]] = (entry["matrices"], entry["filledCells"])
+        url = body["nextCursor"] and f"/api/stats/establishments?limit=2&cursor={body['nextCursor']}"
+    assert seen == {e: v for e, v in expected.items() if v[0]}
+
+    own = login("training@formation.ma").get("/api/stats/establishments").get_json()
+    assert [entry["id"] for entry in own["establishments"]] in ([], [4])
@@ -0,0 +1,41 @@
+"""Databases reach the latest schema version from either starting point."""
+import os
+import sqlite3
+
+import app as backend
+
+LATEST = backend.list_migrations()[-1][0]
+
+
+def columns(con, table):
+    return {r[1] for r in con.execute(f"PRAGMA table_info({table})")}
+
+
+def test_migrate_empty_database(tmp_path):
+    con = sqlite3.connect(tmp_path / "empty.db")
+    backend.migrate(con)
+    assert backend.schema_version(con) == LATEST
+    assert "revision" in columns(con, "matrix_data")
+
+
+def test_migrate_database_built_from_schema_sql(tmp_path):
+    con = sqlite3.connect(tmp_path / "reference.db")
+    for script in ("schema.sql", "seed.sql"):
+        with open(os.path.join(backend.BACKEND_DIR, script), encoding="utf-8") as f:
+            con.executescript(f.read())
+    backend.migrate(con)
+    assert backend.schema_version(con) == LATEST
+    assert "revision" in columns(con, "matrix_data")
+
+
+def test_migrate_adds_sha256_to_an_older_report_files(tmp_path):
+    con = sqlite3.connect(tmp_path / "older.db")
+    con.execute("""CREATE TABLE report_files (
+        file_id INTEGER PRIMARY KEY AUTOINCREMENT, establishment_id INTEGER NOT NULL,
+        year INTEGER NOT NULL, report TEXT NOT NULL, version TEXT NOT NULL,
+        filename TEXT NOT NULL, stored_filepath TEXT UNIQUE NOT NULL, size INTEGER,
+        mtime REAL, uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(establishment_id, year, report, version, filename))""")
+    backend.migrate(con)
+    assert backend.schema_version(con) == LATEST
+    assert "sha256" in columns(con, "report_files")
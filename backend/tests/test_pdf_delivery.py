@@ -0,0 +1,70 @@
+"""GET /uploads/...: ETag and Last-Modified validators, ranges, proxy offload."""
+import hashlib
+import os
+
+import pytest
+
+import app as backend
+
+REL = "etab_1/2025/default/v1/Projet_2025.pdf"
+URL = "/uploads/1/2025/default/v1/Projet_2025.pdf"
+
+
+@pytest.fixture(scope="module")
+def content(data_dir):
+    with open(os.path.join(backend.FILES_ROOT, REL), "rb") as f:
+        return f.read()
+
+
+def test_full_download_has_content_hash_etag(admin, content):
+    response = admin.get(URL)
+    assert response.status_code == 200
+    assert response.data == content
+    assert response.headers["ETag"] == f'"{hashlib.sha256(content).hexdigest()}"'
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert response.headers["Cache-Control"] == backend.PDF_CACHE_CONTROL
+    assert "Last-Modified" in response.headers
+
+
+def test_if_none_match_gives_304(admin):
+    etag = admin.get(URL).headers["ETag"]
+    response = admin.get(URL, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+
+
+def test_if_modified_since_gives_304(admin):
+    last_modified = admin.get(URL).headers["Last-Modified"]
+    response = admin.get(URL, headers={"If-Modified-Since": last_modified})
+    assert response.status_code == 304
+
+
+def test_range_gives_206(admin, content):
+    response = admin.get(URL, headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.data == content[10:20]
+    assert response.headers["Content-Range"] == f"bytes 10-19/{len(content)}"
+
+
+def test_versioned_url_is_immutable(admin, content):
+    response = admin.get(f"{URL}?v={hashlib.sha256(content).hexdigest()}")
+    assert response.headers["Cache-Control"] == backend.PDF_CACHE_IMMUTABLE
+
+
+@pytest.mark.parametrize("mode, header", [("x-accel", "X-Accel-Redirect"), ("x-sendfile", "X-Sendfile")])
+def test_proxy_sends_the_bytes(admin, monkeypatch, mode, header):
+    monkeypatch.setattr(backend, "PDF_SENDFILE", mode)
+    response = admin.get(URL)
+    assert response.status_code == 200
+    assert response.data == b""
+    expected = {
+        "x-accel": backend.PDF_ACCEL_PREFIX + REL,
+        "x-sendfile": os.path.abspath(os.path.join(backend.FILES_ROOT, REL)),
+    }[mode]
+    assert response.headers[header] == expected
+    assert admin.get(URL, headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+
+
+def test_missing_file_and_traversal_are_404(admin):
+    assert admin.get("/uploads/1/2025/default/v1/absent.pdf").status_code == 404
+    assert admin.get("/uploads/1/2025/default/v1/..%2F..%2F..%2Fdetails_1.txt").status_code == 404
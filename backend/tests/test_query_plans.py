@@ -0,0 +1,12 @@
+"""The hot queries keep using their indexes on a fully migrated database."""
+import pytest
+
+import app as backend
+
+
+@pytest.mark.parametrize("name, sql, params, expected", backend.query_plan_checks(),
+                         ids=[check[0] for check in backend.query_plan_checks()])
+def test_query_plan(data_dir, name, sql, params, expected):
+    with backend.pooled_connection() as con:
+        plan = [r[3] for r in con.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+    assert any(expected in line for line in plan), plan
@@ -0,0 +1,48 @@
+"""/reports pages the same way from the details file and from audit_findings."""
+import os
+
+import pytest
+
+import app as backend
+
+ETAB = 4  # training@formation.ma
+
+
+@pytest.fixture(scope="module")
+def reports_client(login):
+    path = backend.details_path(ETAB)
+    with open(path, "w", encoding="utf-8") as f:
+        for n in range(5):
+            f.write("\n".join(f"{field} {n}" for field in backend.DETAILS_FIELDS) + "\n")
+    yield login("training@formation.ma")
+    os.remove(path)
+
+
+def pages(client):
+    out = {}
+    for limit in (-1, 0, 2, 10_000):
+        response = client.get(f"/reports?limit={limit}")
+        assert response.status_code == 200
+        body = response.get_json()
+        out[limit] = (body["limit"], len(body["table"]), body["nextCursor"] is not None)
+    return out
+
+
+def test_limit_is_clamped_for_both_sources(reports_client):
+    expected = {
+        -1: (1, 1, True),
+        0: (1, 1, True),
+        2: (2, 2, True),
+        10_000: (backend.MAX_PAGE_SIZE, 5, False),
+    }
+    assert pages(reports_client) == expected
+
+    with backend.pooled_connection() as con:
+        with con:
+            backend.import_details(con, ETAB, backend.details_path(ETAB))
+    try:
+        assert pages(reports_client) == expected
+    finally:
+        with backend.pooled_connection() as con:
+            with con:
+                con.execute("DELETE FROM audit_findings WHERE establishment_id = ?", (ETAB,))
@@ -0,0 +1,60 @@
+"""ETags follow the resource's own version, shared by every worker process."""
+import sqlite3
+
+import app as backend
+
+YEAR = 2051
+MATRIX = f"/etablissement/1/{YEAR}/matrix"
+
+
+def cells(value):
+    return {row: [value] * len(backend.COLS) for row in backend.ROWS}
+
+
+def external_write(sql, params=()):
+    """A commit from another connection, as another worker process would make."""
+    con = sqlite3.connect(backend.DATABASE)
+    with con:
+        con.execute(sql, params)
+    con.close()
+
+
+def test_unrelated_writes_keep_the_etag(admin):
+    assert admin.post(MATRIX, json=cells("1")).status_code == 200
+    etag = admin.get(MATRIX).headers["ETag"]
+
+    external_write("UPDATE uploads SET received = received WHERE 1")
+    external_write("INSERT INTO matrix_changes (establishment_id, year, revision, cell, value) "
+                   "VALUES (2, ?, 1, 'AE_IC', 'x')", (YEAR,))
+    assert admin.post(f"/etablissement/2/{YEAR}/matrix", json=cells("2")).status_code == 200
+
+    assert admin.get(MATRIX, headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_writes_to_the_resource_change_the_etag(admin):
+    etag = admin.get(MATRIX).headers["ETag"]
+    assert admin.post(MATRIX, json=cells("3")).status_code == 200
+    response = admin.get(MATRIX, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.get_json()["matrix"]["AE"][0] == "3"
+
+
+def test_etag_does_not_depend_on_the_process(admin):
+    etag = admin.get("/api/establishments").headers["ETag"]
+    # a fresh cache stands in for another worker process
+    other = backend.ResponseCache()
+    with backend.app.test_request_context("/api/establishments", headers={"If-None-Match": etag}):
+        backend.session["user"] = {"role": "admin"}
+        assert other.serve(("establishments",), lambda: None).status_code == 304
+
+
+def test_establishment_change_from_elsewhere_is_seen(admin):
+    etag = admin.get("/api/etablissement/1").headers["ETag"]
+    external_write("UPDATE establishments SET name = name || ' (renamed)' WHERE establishment_id = 1")
+    try:
+        response = admin.get("/api/etablissement/1", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.get_json()["etablissement"]["label"].endswith("(renamed)")
+    finally:
+        external_write("UPDATE establishments SET name = replace(name, ' (renamed)', '') "
+                       "WHERE establishment_id = 1")
@@ -0,0 +1,118 @@
+"""Resumable uploads: concurrent completion and expiry of abandoned ones."""
+import hashlib
+import os
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+
+import pytest
+
+import app as backend
+
+DATA = b"%PDF-1.4\n" + os.urandom(3000)
+
+
+def start(client, name, size=len(DATA)):
+    response = client.post("/api/uploads", json={
+        "establishment": 1, "year": 2024, "report": "PV", "version": "v1",
+        "filename": name, "size": size,
+    })
+    assert response.status_code == 201
+    return response.get_json()["uploadId"]
+
+
+def test_concurrent_complete_calls(admin, login, monkeypatch):
+    upload_id = start(admin, "race.pdf")
+    assert admin.put(f"/api/uploads/{upload_id}?offset=0", data=DATA).status_code == 200
+    clients = [login("admin@agro.com") for _ in range(4)]
+    responses = []
+    commit_blob = backend.commit_blob
+
+    def slow_commit_blob(tmp, sha256):
+        # keep the first caller busy until the others are waiting on the lock
+        time.sleep(0.2)
+        return commit_blob(tmp, sha256)
+
+    monkeypatch.setattr(backend, "commit_blob", slow_commit_blob)
+    ready = threading.Barrier(len(clients))
+
+    def complete(client):
+        ready.wait()
+        responses.append(client.post(f"/api/uploads/{upload_id}/complete", json={}))
+
+    threads = [threading.Thread(target=complete, args=(c,)) for c in clients]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert [r.status_code for r in responses] == [200] * 4
+    assert {r.get_json()["sha256"] for r in responses} == {hashlib.sha256(DATA).hexdigest()}
+    assert not os.path.exists(backend.lock_path(upload_id))
+    assert admin.put(f"/api/uploads/{upload_id}?offset=0", data=b"x").status_code == 409
+
+
+def test_abandoned_uploads_expire(admin):
+    stale = start(admin, "stale.pdf")
+    assert admin.put(f"/api/uploads/{stale}?offset=0", data=DATA[:100]).status_code == 200
+    fresh = start(admin, "fresh.pdf")
+    stray = os.path.join(backend.BLOB_ROOT, "partial", "tmpstray.part")
+    open(stray, "wb").close()
+    os.utime(stray, (0, 0))
+
+    with backend.pooled_connection() as con:
+        with con:
+            con.execute("UPDATE uploads SET updated_at = datetime('now', '-2 days') WHERE upload_id = ?",
+                        (stale,))
+        assert backend.expire_uploads(con) == 1
+
+    assert admin.get(f"/api/uploads/{stale}").status_code == 404
+    assert not os.path.exists(backend.partial_path(stale))
+    assert stale not in backend._upload_hashers
+    assert not os.path.exists(backend.lock_path(stale))
+    assert not os.path.exists(stray)
+    assert admin.get(f"/api/uploads/{fresh}").status_code == 200
+
+
+@pytest.mark.skipif(backend.fcntl is None, reason="flock needs fcntl")
+def test_lock_holds_across_processes(admin):
+    upload_id = start(admin, "other-process.pdf")
+    holder = subprocess.Popen([sys.executable, "-c", textwrap.dedent(f"""
+        import fcntl, os, sys, time
+        fd = os.open({backend.lock_path(upload_id)!r}, os.O_RDWR | os.O_CREAT)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        print("locked", flush=True)
+        time.sleep(0.5)
+    """)], stdout=subprocess.PIPE, text=True)
+    try:
+        assert holder.stdout.readline().strip() == "locked"
+        started = time.monotonic()
+        assert admin.put(f"/api/uploads/{upload_id}?offset=0", data=DATA).status_code == 200
+        # the append waited for the other process to let go
+        assert time.monotonic() - started > 0.3
+    finally:
+        holder.wait()
+
+
+def test_malformed_requests(admin):
+    assert admin.post("/api/uploads", json=[1]).status_code == 400
+    assert admin.post("/api/uploads", json={
+        "establishment": 99999, "year": 2024, "report": "PV", "version": "v1", "filename": "x.pdf",
+    }).status_code == 404
+    assert admin.post("/api/uploads", json={
+        "establishment": True, "year": 2024, "report": "PV", "version": "v1", "filename": "x.pdf",
+    }).status_code == 404
+    upload_id = start(admin, "malformed.pdf", size=None)
+    assert admin.post(f"/api/uploads/{upload_id}/complete", json=[1]).status_code == 400
+    assert admin.post(f"/api/uploads/{upload_id}/complete", json={"sha256": 5}).status_code == 400
+
+
+def test_open_upload_without_partial_file(admin):
+    upload_id = start(admin, "lost.pdf")
+    os.remove(backend.partial_path(upload_id))
+    response = admin.get(f"/api/uploads/{upload_id}")
+    assert response.status_code == 409
+    assert response.get_json()["status"] == "open"
+    assert admin.put(f"/api/uploads/{upload_id}?offset=0", data=DATA).status_code == 409
+    assert admin.post(f"/api/uploads/{upload_id}/complete", json={}).status_code == 409
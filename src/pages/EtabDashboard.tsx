@@ -53,21 +53,25 @@ const EtabDashboard: React.FC = () => {
     }
   });
 
+  // One request for every year instead of one per year
   const {
-    data: reportMetadata = [],
+    data: reportsByYear = {},
     isLoading: loadingReports
-  } = useQuery({
-    queryKey: ['report-types', etabData?.id],
+  } = useQuery<Record<string, unknown[]>, Error>({
+    queryKey: ['report-metadata-range', etabData?.id, years],
     queryFn: async () => {
-      const res = await fetch(`/api/report-metadata/${etabData?.id}/${Math.max(...years)}`, {
+      const from = Math.min(...years);
+      const to = Math.max(...years);
+      const res = await fetch(`/api/report-metadata/${etabData?.id}?from=${from}&to=${to}`, {
         credentials: 'include'
       });
       if (!res.ok) throw new Error("Échec chargement rapports");
       const json = await res.json();
-      return json.reports;
+      return json.years;
     },
     enabled: !!etabData && years.length > 0
   });
+  const reportMetadata = reportsByYear[String(Math.max(...years))] ?? [];
 
   if (authLoading) return <p>Vérification de la session…</p>;
 
@@ -106,6 +110,7 @@ const EtabDashboard: React.FC = () => {
                 <CardTitle className="text-xl text-earth-800">{year}</CardTitle>
                 <CardDescription>
                   Consulter toutes les données de {year}
+                  {!loadingReports && ` · ${(reportsByYear[String(year)] ?? []).length} types de rapports`}
                 </CardDescription>
               </CardHeader>
               <CardContent className="space-y-3">
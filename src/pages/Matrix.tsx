@@ -10,7 +10,7 @@ import {
 } from '@/components/ui/card';
 import { useToast } from '@/hooks/use-toast';
 import { useQuery, useQueryClient } from '@tanstack/react-query';
-import { useEffect, useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
 import { Link, useParams } from 'react-router-dom';
 import MatrixCell from '@/components/MatrixCell';
 import CellEditor from '@/components/CellEditor';
@@ -28,11 +28,39 @@ interface MatrixResponse {
   matrix: MatrixData;
   columns: string[];
   rows: string[];
+  revision: number;
+}
+
+interface MatrixChanges {
+  revision: number;
+  changes: Record<string, string>;
+  reset: boolean;
 }
 
 const ROWS = ['AE', 'CE', 'IGF', 'CC'] as const;
 const COLUMNS = ['IC', 'OB', 'REC', 'CA', 'DD', 'DA'] as const;
 
+const mapMatrix = (
+  matrix: MatrixData,
+  fn: (row: keyof MatrixData, colIndex: number, value: string) => string
+): MatrixData =>
+  Object.fromEntries(
+    ROWS.map(row => [row, matrix[row].map((value, idx) => fn(row, idx, value))])
+  ) as unknown as MatrixData;
+
+// { "AE_IC": valeur, ... } pour les cellules de `edited` qui diffèrent de `saved`
+const changedCells = (saved: MatrixData, edited: MatrixData) => {
+  const cells: Record<string, string> = {};
+  ROWS.forEach(row =>
+    COLUMNS.forEach((col, idx) => {
+      if ((edited[row][idx] ?? '') !== (saved[row][idx] ?? '')) {
+        cells[`${row}_${col}`] = edited[row][idx] ?? '';
+      }
+    })
+  );
+  return cells;
+};
+
 export default function Matrix() {
   const { id, year } = useParams<{ id: string; year: string }>();
   const { toast } = useToast();
@@ -46,6 +74,9 @@ export default function Matrix() {
     CC: ['', '', '', '', '', ''],
   });
   const [isSaving, setIsSaving] = useState(false);
+  // Dernier état connu du serveur et sa révision
+  const savedRef = useRef<MatrixData>(mapMatrix(matrixData, () => ''));
+  const revisionRef = useRef(0);
   const [editingCell, setEditingCell] = useState<{
     row: keyof MatrixData;
     colIndex: number;
@@ -86,24 +117,102 @@ export default function Matrix() {
   useEffect(() => {
     if (data) {
       setMatrixData(data.matrix);
+      savedRef.current = data.matrix;
+      revisionRef.current = data.revision ?? 0;
     }
   }, [data]);
 
-  // Enregistrement
+  // Valeurs du serveur, sauf pour les cellules modifiées ici et pas encore enregistrées
+  const applyServerMatrix = (server: MatrixData) => {
+    const before = savedRef.current;
+    savedRef.current = server;
+    setMatrixData(prev =>
+      mapMatrix(prev, (row, idx, value) =>
+        value === before[row][idx] ? server[row][idx] : value
+      )
+    );
+  };
+
+  // Suivi des modifications faites par les autres utilisateurs
+  useEffect(() => {
+    if (!data) return;
+    const controller = new AbortController();
+    let stopped = false;
+
+    // Sans changement, on espace les requêtes (1 s, 2 s, ... jusqu'à 30 s)
+    // pour ne pas occuper en permanence un thread du serveur.
+    let idleDelay = 0;
+
+    const follow = async () => {
+      while (!stopped) {
+        try {
+          const res = await fetch(
+            `/etablissement/${id}/${year}/matrix/changes?since=${revisionRef.current}&wait=10`,
+            { credentials: 'include', signal: controller.signal }
+          );
+          if (!res.ok) throw new Error('Échec du suivi');
+          const feed: MatrixChanges = await res.json();
+          if (feed.reset) {
+            queryClient.invalidateQueries({ queryKey: ['matrix', id, year] });
+            return;
+          }
+          if (feed.revision !== revisionRef.current) {
+            const server = mapMatrix(savedRef.current, (row, idx, value) =>
+              feed.changes[`${row}_${COLUMNS[idx]}`] ?? value
+            );
+            revisionRef.current = feed.revision;
+            applyServerMatrix(server);
+            idleDelay = 0;
+          } else {
+            idleDelay = Math.min(Math.max(idleDelay * 2, 1000), 30000);
+            await new Promise(resolve => setTimeout(resolve, idleDelay));
+          }
+        } catch {
+          if (stopped) return;
+          await new Promise(resolve => setTimeout(resolve, 5000));
+        }
+      }
+    };
+
+    follow();
+    return () => {
+      stopped = true;
+      controller.abort();
+    };
+  }, [data, id, year, queryClient]);
+
+  // Enregistrement : seules les cellules modifiées sont envoyées
   const handleSave = async () => {
+    const sent = mapMatrix(matrixData, (_row, _idx, value) => value);
+    const cells = changedCells(savedRef.current, sent);
+    if (Object.keys(cells).length === 0) {
+      toast({ title: 'Aucune modification', description: 'Rien à enregistrer' });
+      return;
+    }
     setIsSaving(true);
     try {
       const res = await fetch(`/etablissement/${id}/${year}/matrix`, {
-        method: 'POST',
+        method: 'PATCH',
         credentials: 'include',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify(matrixData),
+        body: JSON.stringify({ revision: revisionRef.current, cells }),
       });
+      if (res.status === 409) {
+        const json: { revision: number; matrix: MatrixData } = await res.json();
+        revisionRef.current = json.revision;
+        applyServerMatrix(json.matrix);
+        toast({
+          title: 'Conflit',
+          description: 'La matrice a été modifiée entre-temps. Vérifiez vos valeurs puis enregistrez à nouveau.',
+          variant: 'destructive',
+        });
+        return;
+      }
       if (!res.ok) throw new Error('Échec de l\'enregistrement');
+      const json: { revision: number } = await res.json();
+      savedRef.current = sent;
+      revisionRef.current = json.revision;
       toast({ title: 'Succès', description: 'Données enregistrées' });
-      queryClient.invalidateQueries({
-        queryKey: ['matrix', id, year]
-      });
     } catch {
       toast({
         title: 'Erreur',
@@ -182,7 +291,8 @@ export default function Matrix() {
               Saisie des données matricielles
             </CardTitle>
             <CardDescription>
-              Cliquez sur une cellule pour l'éditer dans une fenêtre dédiée.
+              Cliquez sur une cellule pour l'éditer dans une fenêtre dédiée. Les
+              modifications des autres utilisateurs s'affichent automatiquement.
             </CardDescription>
           </CardHeader>
           <CardContent>